@@ -2,23 +2,66 @@ import streamlit as st
 import os
 import streamlit.components.v1 as components
 from dotenv import load_dotenv
-from flow import create_ingestion_flow, create_retrieval_flow
-from utils.drive_tools import get_service_account_email
-from utils.embedding_models import get_embedding_models
 
-# Load environment variables
+# Load environment variables before the project modules read their settings
 load_dotenv()
 
+from flow import get_retrieval_flow, get_conversation_flow
+from utils.drive_tools import get_service_account_email
+from utils.embedding_models import get_registry
+from utils.embedding_service import EMBEDDING_SERVER
+from utils.ingest_jobs import get_job_manager, ACTIVE_STATES, SUCCEEDED
+from utils.ingest_journal import get_ingest_journal
+from tracing import get_metrics
+
 st.set_page_config(page_title="Google Drive RAG Agent", layout="wide")
 
-# Pre-load embedding models
-with st.spinner("Initializing AI Models..."):
-    get_embedding_models()
+# Load embedding models in the background; the UI renders without waiting for them
+if not EMBEDDING_SERVER:
+    get_registry().warm_up(background=True)
+
+with st.sidebar:
+    # Snapshot: the warm-up thread may still be adding entries
+    load_times = dict(get_registry().load_times)
+    if load_times:
+        st.caption("Embedding models: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in load_times.items()))
+    with st.expander("Node latency metrics"):
+        st.code(get_metrics().to_prometheus(), language="text")
 
 # Env Var Setup
 if "GEMINI_API_KEY" not in os.environ:
     os.environ["GEMINI_API_KEY"] = st.text_input("Enter Gemini API Key", type="password")
 
+STAGE_LABELS = {
+    "download": ("Downloading files", "files"),
+    "retry": ("Retrying failed files", "files"),
+    "index": ("Embedding chunks", "chunks"),
+}
+
+@st.fragment(run_every=2)
+def show_ingest_job(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return
+
+    if job["status"] in ACTIVE_STATES:
+        if not job["stage"]:
+            st.progress(0.0, text=f"Ingestion {job['status']}...")
+        else:
+            label, unit = STAGE_LABELS.get(job["stage"], (job["stage"], "items"))
+            text = f"{label}: {job['done']}/{job['total']}"
+            if job["throughput"]:
+                text += f" · {job['throughput']:.1f} {unit}/s · ETA {job['eta']:.0f}s"
+            st.progress(job["done"] / job["total"] if job["total"] else 0.0, text=text)
+        st.caption(f"Files {job['files_done'] or 0}/{job['files_total'] or '?'} · Chunks embedded {job['chunks_done'] or 0}/{job['chunks_total'] or '?'}")
+        if st.button("Cancel Ingestion"):
+            get_job_manager().cancel(job_id)
+    elif job["status"] == SUCCEEDED:
+        st.success(job["message"])
+        st.info(f"Processed {job['files_total'] or 0} files into {job['chunks_total'] or 0} new chunks.")
+    else:
+        st.error(f"Ingestion {job['status']}: {job['message']}")
+
 st.title("🤖 Chat with your Google Drive (Hybrid Search)")
 
 # Tabs
@@ -42,24 +85,28 @@ with tab1:
         elif "Unknown" in sa_email and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS") and not os.path.exists("service_account.json"):
              st.error("Service Account Credentials not found. Please add 'service_account.json' to the root or set GOOGLE_APPLICATION_CREDENTIALS.")
         else:
-            with st.spinner("Loading files, chunking, and indexing... This may take a while."):
-                shared = {
-                    "folder_id": folder_id_input
-                }
-
-                try:
-                    ingest_flow = create_ingestion_flow()
-                    ingest_flow.run(shared)
+            # Runs on a background thread; the fragment below polls its progress
+            st.session_state.ingest_job = get_job_manager().submit(folder_id_input)
 
-                    st.success(shared.get("index_status", "Ingestion completed!"))
-                    st.info(f"Processed {len(shared.get('documents', []))} files into {len(shared.get('chunks', []))} chunks.")
-
-                except Exception as e:
-                    st.error(f"Ingestion failed: {e}")
+    if "ingest_job" in st.session_state:
+        show_ingest_job(st.session_state.ingest_job)
 
 with tab2:
     st.header("Chat with Data")
 
+    # Searching fewer folders scans less of the index; none selected searches all of them
+    folders = get_ingest_journal().list_folders()
+    selected_folders = st.multiselect(
+        "Search in folders",
+        options=list(folders),
+        format_func=lambda folder_id: f"{folder_id} ({folders[folder_id]} files)",
+        placeholder="All ingested folders",
+    )
+    use_history = st.toggle(
+        "Use conversation history", value=True,
+        help="Rewrite follow-up questions with the earlier messages, and answer close follow-ups from the chunks already retrieved.",
+    )
+
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
@@ -76,19 +123,33 @@ with tab2:
             message_placeholder = st.empty()
             message_placeholder.markdown("Thinking...")
 
-            shared = {"user_query": prompt}
+            shared = {"user_query": prompt, "folder_ids": selected_folders}
 
             try:
-                retrieval_flow = create_retrieval_flow()
-                retrieval_flow.run(shared)
+                if use_history:
+                    shared["chat_history"] = st.session_state.messages[:-1]
+                    shared["previous_retrieval"] = st.session_state.get("retrieval_state")
+                    get_conversation_flow().run(shared)
+                    st.session_state.retrieval_state = shared.get("retrieval_state")
+                else:
+                    get_retrieval_flow().run(shared)
 
                 # Show retrieved snippets (optional debug)
                 context = shared.get("retrieved_context", [])
                 with st.expander("View Retrieved Context"):
+                    if shared.get("original_query", prompt) != shared["user_query"]:
+                        st.caption(f"Searched for: {shared['user_query']}")
+                    if shared.get("context_reused"):
+                        st.caption(f"Reused the previous answer's context (similarity {shared['reuse_similarity']:.2f})")
                     for c in context:
-                        st.markdown(f"**Source:** {c.payload['metadata']['source']}")
-                        st.text(c.payload['text'][:200] + "...")
+                        st.markdown(f"**Source:** {c.payload['source']}")
+                        if len(c.payload.get('sources', [])) > 1:
+                            st.caption(f"Also in: {', '.join(c.payload['sources'][1:])}")
+                        st.text(c.payload.get('text', '')[:200] + "...")
                         st.divider()
+                    stats = shared.get("context_stats")
+                    if stats:
+                        st.caption(f"Context: {stats['context_tokens']} tokens ({stats['tokens_saved']} saved)")
 
                 answer = shared.get("answer", "I couldn't generate an answer.")
                 message_placeholder.markdown(answer)
@@ -1,12 +1,111 @@
 from fastmcp import FastMCP
-from utils.drive_tools import search_files, read_file, get_drive_service
+from dotenv import load_dotenv
+
+# Before the project modules read their settings
+load_dotenv()
+
+from utils.drive_tools import search_files, read_file, get_file_metadata, batch_get_metadata
+from utils.search import hybrid_search
+from utils.vector_store import hydrate_chunk_text
+from utils.ingest_journal import get_ingest_journal
+from utils.embedding_models import get_registry
+from utils.embedding_service import EMBEDDING_SERVER
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import os
 
 # Initialize FastMCP server
 mcp = FastMCP("Google Drive MCP")
 
+# Maximum chunks returned by search_documents
+MAX_SEARCH_RESULTS = 20
+
+# Blocking work (Drive API, text extraction, embedding, Qdrant) runs on this
+# bounded pool so a slow call never stalls the server's event loop.
+MCP_WORKERS = int(os.getenv("MCP_WORKERS", "16"))
+# Seconds a tool call may take, including time waiting for a slot
+MCP_TOOL_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", "60"))
+# Concurrent calls per tool; Drive downloads get fewer slots so searches stay fast
+TOOL_CONCURRENCY = {
+    "list_files": 8,
+    "get_files_metadata": 8,
+    "search_documents": 8,
+    "get_file_content": 4,
+}
+
+_executor = ThreadPoolExecutor(MCP_WORKERS, thread_name_prefix="mcp-tool")
+_tool_slots = {name: asyncio.Semaphore(limit) for name, limit in TOOL_CONCURRENCY.items()}
+
+async def run_blocking(tool, fn, *args):
+    """
+    Runs fn(*args) on the worker pool under the tool's concurrency limit and timeout.
+    A call that times out keeps its slot until the worker thread finishes, so
+    abandoned work still counts against the limit.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MCP_TOOL_TIMEOUT
+    slots = _tool_slots[tool]
+    await asyncio.wait_for(slots.acquire(), MCP_TOOL_TIMEOUT)
+    future = loop.run_in_executor(_executor, fn, *args)
+    future.add_done_callback(lambda _: slots.release())
+    return await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - loop.time()))
+
+def _list_files(query):
+    files = search_files(query)
+    if not files:
+        return "No files found."
+
+    result = "Files found:\n"
+    for f in files:
+        result += f"- {f['name']} (ID: {f['id']}, MIME: {f['mimeType']})\n"
+    return result
+
+def _search_documents(query, limit, folder_ids=None):
+    points = hybrid_search(query, limit=max(1, min(limit, MAX_SEARCH_RESULTS)), folder_ids=folder_ids)
+    if not points:
+        return "No matching documents found."
+
+    hydrate_chunk_text(points)
+    result = ""
+    for rank, p in enumerate(points, 1):
+        payload = p.payload or {}
+        result += (
+            f"{rank}. {payload.get('source')} (ID: {payload.get('file_id')}, "
+            f"chunk {payload.get('chunk_index')}, score {p.score:.3f})\n"
+        )
+        also_in = payload.get("sources", [])[1:]
+        if also_in:
+            result += f"Also in: {', '.join(also_in)}\n"
+        result += f"{payload.get('text', '')}\n\n"
+    return result
+
+def _get_file_content(file_id, mime_type):
+    # Text extracted during ingestion
+    content = get_ingest_journal().get_content(file_id)
+    if content:
+        return content
+
+    # If mime_type is not provided, try to fetch it
+    if not mime_type:
+        mime_type = get_file_metadata(file_id).get('mimeType')
+
+    return read_file(file_id, mime_type)
+
+def _get_files_metadata(file_ids):
+    if not file_ids:
+        return "No file IDs given."
+
+    # One line per requested ID, found or not
+    metadata = batch_get_metadata(file_ids)
+    result = ""
+    for file_id in file_ids:
+        f = metadata.get(file_id)
+        result += f"- {f['name']} (ID: {file_id}, MIME: {f['mimeType']})\n" if f else f"- ID: {file_id} not found\n"
+    return result
+
 @mcp.tool
-def list_files(query: str) -> str:
+async def list_files(query: str) -> str:
     """
     List files in Google Drive based on a query.
 
@@ -14,37 +113,63 @@ def list_files(query: str) -> str:
         query: The name query to search for.
     """
     try:
-        files = search_files(query)
-        if not files:
-            return "No files found."
-
-        result = "Files found:\n"
-        for f in files:
-            result += f"- {f['name']} (ID: {f['id']}, MIME: {f['mimeType']})\n"
-        return result
+        return await run_blocking("list_files", _list_files, query)
+    except asyncio.TimeoutError:
+        return f"Error listing files: timed out after {MCP_TOOL_TIMEOUT:g}s"
     except Exception as e:
         return f"Error listing files: {str(e)}"
 
 @mcp.tool
-def get_file_content(file_id: str, mime_type: str = None) -> str:
+async def get_files_metadata(file_ids: list[str]) -> str:
     """
-    Read the content of a file from Google Drive.
+    Look up names and MIME types of files (sent to Drive in batches of 100).
+
+    Args:
+        file_ids: IDs of the files, e.g. from search_documents results.
+    """
+    try:
+        return await run_blocking("get_files_metadata", _get_files_metadata, file_ids)
+    except asyncio.TimeoutError:
+        return f"Error reading file metadata: timed out after {MCP_TOOL_TIMEOUT:g}s"
+    except Exception as e:
+        return f"Error reading file metadata: {str(e)}"
+
+@mcp.tool
+async def search_documents(query: str, limit: int = 5, folder_ids: list[str] | None = None) -> str:
+    """
+    Semantic search over the indexed Drive documents (hybrid dense + sparse, ColBERT re-ranked).
+
+    Args:
+        query: What to look for, in natural language.
+        limit: Number of chunks to return (max 20).
+        folder_ids: Only search documents ingested from these Drive folders (default: all).
+    """
+    try:
+        return await run_blocking("search_documents", _search_documents, query, limit, folder_ids)
+    except asyncio.TimeoutError:
+        return f"Error searching documents: timed out after {MCP_TOOL_TIMEOUT:g}s"
+    except Exception as e:
+        return f"Error searching documents: {str(e)}"
+
+@mcp.tool
+async def get_file_content(file_id: str, mime_type: str = None) -> str:
+    """
+    Read the content of a file. Ingested files are served from the local index;
+    others are downloaded from Google Drive.
 
     Args:
         file_id: The ID of the file to read.
         mime_type: The MIME type of the file (optional, but recommended for Google Docs/PDFs).
     """
     try:
-        # If mime_type is not provided, try to fetch it
-        if not mime_type:
-            service = get_drive_service()
-            file_meta = service.files().get(fileId=file_id).execute()
-            mime_type = file_meta.get('mimeType')
-
-        content = read_file(file_id, mime_type)
-        return content
+        return await run_blocking("get_file_content", _get_file_content, file_id, mime_type)
+    except asyncio.TimeoutError:
+        return f"Error reading file content: timed out after {MCP_TOOL_TIMEOUT:g}s"
     except Exception as e:
         return f"Error reading file content: {str(e)}"
 
 if __name__ == "__main__":
+    # Load embedding models before the first search arrives
+    if not EMBEDDING_SERVER:
+        get_registry().warm_up(background=True)
     mcp.run()
@@ -1,29 +1,108 @@
-from pocketflow import Flow
+from functools import lru_cache
+
+from pocketflow import Flow, Parallel
+from tracing import trace_flow
 from nodes import (
     ExtractSearchTermNode,
     AnswerNode,
     LoadFolderNode,
     ChunkNode,
+    DedupChunksNode,
     QdrantIndexNode,
-    QdrantSearchNode
+    EmbedQueryNode,
+    QdrantSearchNode,
+    CondenseQueryNode,
+    ReuseContextNode
 )
 
+# Traced flows: Langfuse spans when configured, in-process metrics always
+@trace_flow(flow_name="IngestionFlow")
+class IngestionFlow(Flow):
+    pass
+
+@trace_flow(flow_name="RetrievalFlow")
+class RetrievalFlow(Flow):
+    pass
+
+@trace_flow(flow_name="SearchFlow")
+class SearchFlow(Flow):
+    pass
+
+@trace_flow(flow_name="ConversationFlow")
+class ConversationFlow(Flow):
+    pass
+
 def create_ingestion_flow():
     load = LoadFolderNode()
     chunk = ChunkNode()
+    dedup = DedupChunksNode()
     index = QdrantIndexNode()
 
-    load >> chunk >> index
+    load >> chunk >> dedup >> index
 
-    return Flow(start=load)
+    return IngestionFlow(start=load)
 
 def create_retrieval_flow():
     # We can skip extraction if we trust the raw query or use Qdrant's query_text
-    # But let's keep it simple: Query -> Search -> Answer
+    # Query -> (Dense | Sparse | ColBERT embedding, concurrently) -> Search -> Answer
+    embed_query = Parallel(
+        EmbedQueryNode("dense"),
+        EmbedQueryNode("sparse"),
+        EmbedQueryNode("colbert")
+    )
+    search = QdrantSearchNode()
+    answer = AnswerNode()
+
+    embed_query >> search >> answer
 
+    return RetrievalFlow(start=embed_query)
+
+def create_conversation_flow():
+    # Follow-up -> standalone question -> dense embedding; close to the previous
+    # turn's query: answer from its chunks, otherwise the full retrieval path
+    condense = CondenseQueryNode()
+    reuse = ReuseContextNode()
+    # The dense vector comes from the reuse check
+    embed_query = Parallel(
+        EmbedQueryNode("sparse"),
+        EmbedQueryNode("colbert")
+    )
     search = QdrantSearchNode()
     answer = AnswerNode()
 
-    search >> answer
+    condense >> reuse
+    reuse - "reuse" >> answer
+    reuse >> embed_query >> search >> answer
+
+    return ConversationFlow(start=condense)
+
+def create_search_flow():
+    # Retrieval without the answer step: Query -> embeddings -> Search
+    embed_query = Parallel(
+        EmbedQueryNode("dense"),
+        EmbedQueryNode("sparse"),
+        EmbedQueryNode("colbert")
+    )
+    # Search errors propagate, so the HTTP service can answer 500 instead of no results
+    embed_query >> QdrantSearchNode(raise_errors=True)
+
+    return SearchFlow(start=embed_query)
+
+# Built and instrumented once per process. Flow._orch runs a shallow copy of
+# each node, so per-run params/retry state never touch the shared graph and
+# one instance can serve concurrent runs.
+@lru_cache(maxsize=None)
+def get_ingestion_flow():
+    return create_ingestion_flow()
+
+@lru_cache(maxsize=None)
+def get_retrieval_flow():
+    return create_retrieval_flow()
+
+@lru_cache(maxsize=None)
+def get_conversation_flow():
+    return create_conversation_flow()
 
-    return Flow(start=search)
+@lru_cache(maxsize=None)
+def get_search_flow():
+    return create_search_flow()
@@ -0,0 +1,66 @@
+"""
+Headless ingestion of a Google Drive folder, without Streamlit.
+
+    python ingest.py <folder_id>            # ingest, resuming an interrupted run
+    python ingest.py <folder_id> --status   # show journaled progress only
+    python ingest.py <folder_id> --restart  # forget progress and start over
+"""
+import argparse
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from flow import get_ingestion_flow
+from utils.ingest_journal import get_ingest_journal
+
+def print_progress(stage, done, total, detail=""):
+    end = "\n" if done == total else ""
+    sys.stdout.write(f"\r{stage:<8} {done}/{total} {detail[:60]:<60}{end}")
+    sys.stdout.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a Google Drive folder into the local Qdrant index.")
+    parser.add_argument("folder_id", help="ID of the Drive folder (shared with the service account)")
+    parser.add_argument("--status", action="store_true", help="print the journal summary for the folder and exit")
+    parser.add_argument("--restart", action="store_true", help="ignore previous progress for this folder and index every file again")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    args = parser.parse_args()
+
+    journal = get_ingest_journal()
+    if args.status:
+        print(journal.summary(args.folder_id) or "No files journaled for this folder.")
+        for f in journal.get_failures(args.folder_id):
+            print(f"  failed: {f['name']} ({f['id']}): {f['error']}")
+        return 0
+    if args.restart:
+        journal.forget_folder(args.folder_id)
+
+    shared = {"folder_id": args.folder_id, "restart": args.restart}
+    if not args.quiet:
+        shared["on_progress"] = print_progress
+
+    start = time.time()
+    try:
+        get_ingestion_flow().run(shared)
+    except Exception as e:
+        print(f"\nIngestion failed: {e}. Run again to resume.", file=sys.stderr)
+        return 1
+
+    print(shared.get("index_status", "Ingestion completed!"))
+    failed = shared.get("failed_files", [])
+    if failed:
+        print(f"{len(failed)} files could not be read (run again to retry them):", file=sys.stderr)
+        for f in failed:
+            print(f"  {f['name']} ({f['id']}): {f['error']}", file=sys.stderr)
+    print(f"Processed {len(shared.get('documents', []))} files into {len(shared.get('chunks', []))} chunks "
+          f"in {time.time() - start:.1f}s. Journal: {journal.summary(args.folder_id)}")
+    dedup = shared.get("dedup_stats")
+    if dedup:
+        print(f"Dedup: {dedup['chunks_in']} -> {dedup['chunks_out']} chunks ({dedup['exact_duplicates']} exact, "
+              f"{dedup['near_duplicates']} near duplicates, {dedup['removed_pct']}% not embedded)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,72 @@
-from pocketflow import Node
+from pocketflow import Node, MemoryCache, DiskCache
 from utils.call_llm import call_llm
-from utils.drive_tools import search_files, read_file, get_drive_service
+from utils.drive_tools import read_file, get_drive_service, list_folder_files, DriveReadError
 import os
+import copy
+import time
 import uuid
 import logging
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, SparseVectorParams, Filter, FieldCondition, MatchValue, Prefetch, SparseVector
-from utils.embedding_models import get_embedding_models
+import numpy as np
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, SparseVectorParams, HnswConfigDiff,
+    Filter, FieldCondition, MatchValue, MatchAny, IsEmptyCondition, PayloadField
+)
+from utils.embedding_service import embed
+from utils.chunking import chunk_documents
+from utils.dedup import dedup_chunks
+from utils.search import embed_query, hybrid_search
+from utils.context_builder import build_context, context_token_budget
+from utils.ingest_journal import get_ingest_journal, DOWNLOADED, INDEXED, EMPTY
+from utils.vector_store import (
+    COLLECTION_NAME,
+    TENANT_FIELD,
+    get_qdrant_client,
+    create_tenant_index,
+    external_text_enabled,
+    get_chunk_text_store,
+    hydrate_chunk_text
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Exec-result caches (see pocketflow Node(cache=...)).
+# Search results are dropped whenever the index changes.
+SEARCH_CACHE = MemoryCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "600"))
+)
+QUERY_VECTOR_CACHE = MemoryCache(maxsize=1024)
+LLM_CACHE = DiskCache(
+    os.getenv("LLM_CACHE_PATH", "./node_cache.sqlite"),
+    ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+)
+
+# Chunks embedded and upserted per batch; files are never split across batches
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+
+# Conversation-aware retrieval: history messages the follow-up rewrite sees, and the
+# dense cosine similarity to the previous turn's query above which its chunks are reused
+CONDENSE_HISTORY_MESSAGES = int(os.getenv("CONDENSE_HISTORY_MESSAGES", "6"))
+CONTEXT_REUSE_THRESHOLD = float(os.getenv("CONTEXT_REUSE_THRESHOLD", "0.9"))
+
+# Extra passes over files that failed with quota or transient Drive errors,
+# RETRY_ROUND_DELAY * round seconds apart
+INGEST_RETRY_ROUNDS = int(os.getenv("INGEST_RETRY_ROUNDS", "2"))
+RETRY_ROUND_DELAY = 15
+
+def report_progress(on_progress, stage, done, total, detail=""):
+    """Calls the optional shared["on_progress"](stage, done, total, detail) callback."""
+    if on_progress:
+        on_progress(stage, done, total, detail)
+
 # --- Existing Nodes (Modified if needed) ---
 
 class ExtractSearchTermNode(Node):
+    def __init__(self, cache=LLM_CACHE, **kwargs):
+        super().__init__(cache=cache, **kwargs)
+
     def prep(self, shared):
         return shared.get("user_query", "")
 
@@ -33,28 +84,100 @@ class ExtractSearchTermNode(Node):
         shared["search_term"] = exec_res
         return "default"
 
-class AnswerNode(Node):
+class CondenseQueryNode(Node):
+    """
+    Node to rewrite a follow-up question into a standalone one using the chat
+    history (shared["chat_history"], a list of {"role", "content"} messages).
+    The first question of a conversation is used as is. The rewrite replaces
+    shared["user_query"]; the question as typed stays in shared["original_query"].
+    """
+    def __init__(self, cache=LLM_CACHE, **kwargs):
+        super().__init__(cache=cache, **kwargs)
+
     def prep(self, shared):
-        return shared.get("user_query"), shared.get("retrieved_context", [])
+        # Long answers are cut: the rewrite needs the topic, not the details
+        history = tuple(
+            (m["role"], m["content"][:1000]) for m in shared.get("chat_history", [])[-CONDENSE_HISTORY_MESSAGES:]
+        )
+        return shared.get("user_query", ""), history
 
     def exec(self, inputs):
-        query, context_list = inputs
-
-        context_text = "\n\n".join([c.payload['text'] for c in context_list]) if context_list else "No relevant context found."
+        user_query, history = inputs
+        if not history or not user_query:
+            return user_query
 
+        conversation = "\n".join(f"{role.capitalize()}: {content}" for role, content in history)
         prompt = f"""
+        Conversation:
+        {conversation}
+
+        Follow-up Question: {user_query}
+
+        Task: Rewrite the follow-up question as a standalone question that can be
+        understood without the conversation, resolving pronouns and references.
+        If it is already standalone, return it unchanged.
+        Keep the language of the follow-up question. Return only the question.
+        """
+        response = call_llm(prompt)
+        return response.strip() or user_query
+
+    def exec_fallback(self, prep_res, exc):
+        # Search with the question as typed; not cached
+        logger.warning(f"Query rewrite failed: {exc}")
+        return prep_res[0]
+
+    def post(self, shared, prep_res, exec_res):
+        shared["original_query"] = prep_res[0]
+        shared["user_query"] = exec_res
+        if exec_res != prep_res[0]:
+            logger.info(f"Rewrote follow-up {prep_res[0]!r} as {exec_res!r}")
+        return "default"
+
+def answer_context(query, points):
+    """Context text and stats for answering query from the retrieved points."""
+    # Chunk text may live outside Qdrant; fetch it only for the chunks we answer from
+    hydrate_chunk_text(points)
+    # Dedupe overlapping neighbours and pack the best chunks into the token budget
+    return build_context(points, context_token_budget(query or ""))
+
+def answer_prompt(query, context_text):
+    return f"""
         User Query: {query}
 
         Context:
-        {context_text[:20000]}
+        {context_text or "No relevant context found."}
 
         Task: Answer the user's question based *only* on the context provided above.
         Answer in the same language as the User Query.
         """
-        return call_llm(prompt)
+
+class AnswerNode(Node):
+    def prep(self, shared):
+        query = shared.get("user_query")
+        context_text, stats = answer_context(query, shared.get("retrieved_context", []))
+        return query, context_text, stats
+
+    def exec(self, inputs):
+        query, context_text, _ = inputs
+        return call_llm(answer_prompt(query, context_text))
 
     def post(self, shared, prep_res, exec_res):
+        stats = prep_res[2]
+        logger.info(f"Context: {stats['context_tokens']} tokens, {stats['tokens_saved']} saved vs. raw join.")
+        shared["context_stats"] = stats
         shared["answer"] = exec_res
+
+        # What the next turn needs to reuse these chunks (ReuseContextNode). A reused
+        # set keeps the query it was retrieved for, so follow-ups cannot drift from it.
+        dense = shared.get("query_vectors", {}).get("dense")
+        if shared.get("context_reused"):
+            shared["retrieval_state"] = shared.get("previous_retrieval")
+        elif dense is not None:
+            shared["retrieval_state"] = {
+                "dense": dense,
+                "points": shared.get("retrieved_context", []),
+                "folder_ids": list(shared.get("folder_ids") or []),
+            }
         return "default"
 
 # --- New Nodes ---
@@ -62,12 +185,15 @@ class AnswerNode(Node):
 class LoadFolderNode(Node):
     """
     Node to load all files from a specific Google Drive Folder ID.
-    Checks if files are already indexed in Qdrant to avoid redundant processing.
+    Downloads are recorded in the ingest journal: indexed files are skipped and
+    files downloaded by an interrupted run are reused without calling Drive.
+    With shared["restart"] every file is downloaded and indexed again.
     """
     def prep(self, shared):
-        return shared.get("folder_id")
+        return shared.get("folder_id"), shared.get("on_progress"), shared.get("restart", False)
 
-    def exec(self, folder_id):
+    def exec(self, inputs):
+        folder_id, on_progress, restart = inputs
         if not folder_id:
             raise ValueError("No Folder ID provided.")
 
@@ -75,63 +201,124 @@ class LoadFolderNode(Node):
         if not service:
             raise RuntimeError("Could not create Drive Service.")
 
-        # List all non-trashed files in the folder
-        query = f"'{folder_id}' in parents and trashed = false"
-        results = service.files().list(
-            q=query, pageSize=100, fields="nextPageToken, files(id, name, mimeType)"
-        ).execute()
-
-        files = results.get('files', [])
+        # List all non-trashed files in the folder (every page)
+        files = list_folder_files(folder_id)
         logger.info(f"Found {len(files)} files in folder {folder_id}")
 
+        # We skip folders inside folders for this simple iteration
+        files = [f for f in files if f['mimeType'] != 'application/vnd.google-apps.folder']
+
+        journal = get_ingest_journal()
+        states = {} if restart else journal.get_states(f['id'] for f in files)
+
         # Check existing files in Qdrant
-        db_path = "./qdrant_db"
-        collection_name = "drive_docs_vn"
-        client = QdrantClient(path=db_path)
-
-        # We process files one by one and check existence
-        documents = []
-        for f in files:
-            # We skip folders inside folders for this simple iteration
-            if f['mimeType'] == 'application/vnd.google-apps.folder':
-                continue
+        collection_name = COLLECTION_NAME
+        client = get_qdrant_client()
+        if not client.collection_exists(collection_name):
+            # Index was removed: rebuild it from the journaled content
+            states = {k: DOWNLOADED if v == INDEXED else v for k, v in states.items()}
 
+        # We process files one by one and commit each download
+        documents, failed, already_indexed = [], [], []
+        for n, f in enumerate(files, 1):
             file_id = f['id']
+            state = states.get(file_id)
+
+            if state in (INDEXED, EMPTY):
+                logger.info(f"Skipping file {f['name']} (ID: {file_id}) - already {state}.")
+                if state == INDEXED:
+                    already_indexed.append(file_id)
+            elif state == DOWNLOADED and (content := journal.get_content(file_id)):
+                logger.info(f"Resuming file {f['name']} from the ingest journal.")
+                documents.append({"name": f['name'], "id": file_id, "content": content})
+            elif not restart and (chunk_count := self._indexed_in_qdrant(client, collection_name, file_id)):
+                # Indexed before the journal existed: journal it, so the folder is listed
+                logger.info(f"Skipping file {f['name']} (ID: {file_id}) - already indexed.")
+                journal.record_indexed(folder_id, f, chunk_count)
+                already_indexed.append(file_id)
+            else:
+                self._download(folder_id, f, journal, documents, failed)
+
+            report_progress(on_progress, "download", n, len(files), f['name'])
+
+        if already_indexed:
+            self._tag_folder(client, collection_name, folder_id, already_indexed)
+
+        # Retry queue: files that hit quota or transient errors get another go
+        # once the limiter has slowed down and the quota window has moved on
+        for round_no in range(1, INGEST_RETRY_ROUNDS + 1):
+            retry = [(f, e) for f, e in failed if e.retryable]
+            if not retry:
+                break
+            failed = [(f, e) for f, e in failed if not e.retryable]
+            logger.info(f"Retrying {len(retry)} files (round {round_no}/{INGEST_RETRY_ROUNDS})")
+            time.sleep(RETRY_ROUND_DELAY * round_no)
+            for n, (f, _) in enumerate(retry, 1):
+                self._download(folder_id, f, journal, documents, failed)
+                report_progress(on_progress, "retry", n, len(retry), f['name'])
+
+        for f, e in failed:
+            journal.record_failure(folder_id, f, str(e))
+        if failed:
+            logger.warning(f"{len(failed)} files could not be read: {', '.join(f['name'] for f, _ in failed)}")
+
+        return documents, [{"id": f['id'], "name": f['name'], "error": str(e)} for f, e in failed]
+
+    def _download(self, folder_id, f, journal, documents, failed):
+        """Reads one file into documents, or appends (file, DriveReadError) to failed."""
+        logger.info(f"Reading file: {f['name']}")
+        try:
+            content = read_file(f['id'], f['mimeType'])
+        except DriveReadError as e:
+            logger.error(f"Failed to read file {f['name']}: {e}")
+            failed.append((f, e))
+            return
+        journal.record_download(folder_id, f, content)
+        if content and len(content.strip()) > 0:
+            documents.append({"name": f['name'], "id": f['id'], "content": content})
+
+    def _tag_folder(self, client, collection_name, folder_id, file_ids):
+        """Adds the folder to points indexed before the index was partitioned by folder."""
+        client.set_payload(
+            collection_name=collection_name,
+            payload={TENANT_FIELD: folder_id},
+            points=Filter(
+                must=[
+                    FieldCondition(key="file_id", match=MatchAny(any=file_ids)),
+                    IsEmptyCondition(is_empty=PayloadField(key=TENANT_FIELD))
+                ]
+            )
+        )
 
-            # Check if this file is already indexed
-            if client.collection_exists(collection_name):
-                count_result = client.count(
-                    collection_name=collection_name,
-                    count_filter=Filter(
-                        must=[
-                            FieldCondition(
-                                key="file_id",
-                                match=MatchValue(value=file_id)
-                            )
-                        ]
+    def _indexed_in_qdrant(self, client, collection_name, file_id):
+        """Number of points holding the file's text (0 if it is not indexed)."""
+        if not client.collection_exists(collection_name):
+            return 0
+        # A file may only own some chunks and share the rest (file_ids) after dedup
+        count_result = client.count(
+            collection_name=collection_name,
+            count_filter=Filter(
+                should=[
+                    FieldCondition(
+                        key="file_id",
+                        match=MatchValue(value=file_id)
+                    ),
+                    FieldCondition(
+                        key="file_ids",
+                        match=MatchValue(value=file_id)
                     )
-                )
-                if count_result.count > 0:
-                    logger.info(f"Skipping file {f['name']} (ID: {file_id}) - already indexed.")
-                    continue
-
-            logger.info(f"Reading file: {f['name']}")
-            try:
-                content = read_file(f['id'], f['mimeType'])
-                if content and isinstance(content, str) and len(content.strip()) > 0:
-                     documents.append({"name": f['name'], "id": f['id'], "content": content})
-            except Exception as e:
-                logger.error(f"Failed to read file {f['name']}: {e}")
-
-        return documents
+                ]
+            )
+        )
+        return count_result.count
 
     def post(self, shared, prep_res, exec_res):
-        shared["documents"] = exec_res
+        shared["documents"], shared["failed_files"] = exec_res
         return "default"
 
 class ChunkNode(Node):
     """
-    Node to chunk documents.
+    Node to chunk documents into pieces that fit the embedding model's token limit.
     """
     def prep(self, shared):
         return shared.get("documents", [])
@@ -140,24 +327,8 @@ class ChunkNode(Node):
         if not documents:
             return []
 
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
-
-        chunked_docs = []
-        for doc in documents:
-            chunks = splitter.split_text(doc['content'])
-            for i, chunk in enumerate(chunks):
-                chunked_docs.append({
-                    "text": chunk,
-                    "metadata": {
-                        "source": doc['name'],
-                        "file_id": doc['id'],
-                        "chunk_index": i
-                    }
-                })
+        # Token-aware splitter, sized to the dense model's input limit
+        chunked_docs = chunk_documents(documents)
 
         logger.info(f"Generated {len(chunked_docs)} chunks from {len(documents)} documents.")
         return chunked_docs
@@ -166,26 +337,39 @@ class ChunkNode(Node):
         shared["chunks"] = exec_res
         return "default"
 
-class QdrantIndexNode(Node):
+class DedupChunksNode(Node):
     """
-    Node to index chunks into Qdrant using FastEmbed for Hybrid Search (Dense + Sparse + ColBERT).
+    Node to collapse exact and near-duplicate chunks (copies and versions of the
+    same document) before they are embedded. Kept chunks list every file their
+    text appears in; stats go to shared["dedup_stats"].
     """
     def prep(self, shared):
         return shared.get("chunks", [])
 
     def exec(self, chunks):
-        if not chunks:
-            return "No chunks to index."
+        return dedup_chunks(chunks)
+
+    def post(self, shared, prep_res, exec_res):
+        shared["chunks"], shared["dedup_stats"] = exec_res
+        return "default"
 
-        db_path = "./qdrant_db"
-        if not os.path.exists(db_path):
-            os.makedirs(db_path)
+class QdrantIndexNode(Node):
+    """
+    Node to index chunks into Qdrant using FastEmbed for Hybrid Search (Dense + Sparse + ColBERT).
+    Chunks are indexed in batches of whole files; each file is marked indexed in
+    the ingest journal once every chunk holding its text (including deduplicated
+    chunks owned by other files) is upserted.
+    """
+    def prep(self, shared):
+        return shared.get("chunks", []), shared.get("on_progress"), shared.get("folder_id")
 
-        client = QdrantClient(path=db_path)
-        collection_name = "drive_docs_vn"
+    def exec(self, inputs):
+        chunks, on_progress, folder_id = inputs
+        if not chunks:
+            return "No chunks to index."
 
-        # Get cached models
-        dense_model, sparse_model, colbert_model = get_embedding_models()
+        client = get_qdrant_client()
+        collection_name = COLLECTION_NAME
 
         # Check if collection exists and create if NOT exists (incremental update)
         if not client.collection_exists(collection_name):
@@ -197,19 +381,58 @@ class QdrantIndexNode(Node):
                 },
                 sparse_vectors_config={
                     "sparse": SparseVectorParams(index=None) # Default index
-                }
+                },
+                # Extra HNSW links within each folder, for folder-filtered searches
+                hnsw_config=HnswConfigDiff(payload_m=16)
             )
+        # Also for collections created before the index was partitioned by folder
+        create_tenant_index(client, collection_name)
 
         logger.info("Generating embeddings and indexing...")
 
-        # Process in batches (if needed, but simple list for now)
+        # Group chunks by file, keeping document order
+        chunks_by_file = {}
+        for c in chunks:
+            chunks_by_file.setdefault(c['metadata']['file_id'], []).append(c)
+
+        # Chunks holding each file's text, and how many are still to be upserted
+        chunk_counts = {}
+        for c in chunks:
+            for file_id in c['metadata'].get('file_ids', [c['metadata']['file_id']]):
+                chunk_counts[file_id] = chunk_counts.get(file_id, 0) + 1
+        pending = dict(chunk_counts)
+
+        journal = get_ingest_journal()
+        batch, done = [], 0
+        for n, (file_id, file_chunks) in enumerate(chunks_by_file.items(), 1):
+            batch.extend(file_chunks)
+            if len(batch) < INGEST_BATCH_SIZE and n < len(chunks_by_file):
+                continue
+
+            self._index_batch(client, collection_name, batch, folder_id)
+            finished = {}
+            for c in batch:
+                for fid in c['metadata'].get('file_ids', [c['metadata']['file_id']]):
+                    pending[fid] -= 1
+                    if pending[fid] == 0:
+                        finished[fid] = chunk_counts[fid]
+            journal.mark_indexed(finished)
+            done += len(batch)
+            report_progress(on_progress, "index", done, len(chunks), f"{n}/{len(chunks_by_file)} files")
+            batch = []
+
+        return f"Successfully indexed {len(chunks)} chunks with Hybrid + ColBERT embeddings."
+
+    def _index_batch(self, client, collection_name, chunks, folder_id):
         docs_text = [c['text'] for c in chunks]
 
-        # Generate all embeddings
-        # Generators return iterables, we consume them
-        dense_embeddings = list(dense_model.embed(docs_text))
-        sparse_embeddings = list(sparse_model.embed(docs_text))
-        colbert_embeddings = list(colbert_model.embed(docs_text))
+        # Generate all embeddings (bulk lane when an embedding server is used)
+        dense_embeddings = embed("dense", docs_text, priority="bulk")
+        sparse_embeddings = embed("sparse", docs_text, priority="bulk")
+        colbert_embeddings = embed("colbert", docs_text, priority="bulk")
+
+        store_text_in_payload = not external_text_enabled()
+        external_texts = []
 
         points = []
         for i, text in enumerate(docs_text):
@@ -219,6 +442,13 @@ class QdrantIndexNode(Node):
             chunk_idx = chunks[i]['metadata']['chunk_index']
             point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{file_id}_{chunk_idx}"))
 
+            payload = dict(chunks[i]['metadata'])
+            payload[TENANT_FIELD] = folder_id
+            if store_text_in_payload:
+                payload["text"] = text
+            else:
+                external_texts.append((point_id, text))
+
             # Create PointStruct
             points.append(PointStruct(
                 id=point_id,
@@ -227,86 +457,119 @@ class QdrantIndexNode(Node):
                     "colbert": colbert_embeddings[i].tolist(),
                     "sparse": sparse_embeddings[i].as_object()
                 },
-                payload={
-                    "text": text,
-                    **chunks[i]['metadata']
-                }
+                payload=payload
             ))
 
+        # Text first, so every indexed point can be resolved
+        if external_texts:
+            get_chunk_text_store().put_many(external_texts)
+
         # Upsert
         client.upsert(
             collection_name=collection_name,
             points=points
         )
 
-        return f"Successfully indexed {len(chunks)} chunks with Hybrid + ColBERT embeddings."
-
     def post(self, shared, prep_res, exec_res):
         shared["index_status"] = exec_res
+        # Invalidates search results cached by every process sharing the journal
+        get_ingest_journal().bump_index_generation()
+        SEARCH_CACHE.clear()
         return "default"
 
-class QdrantSearchNode(Node):
+class EmbedQueryNode(Node):
     """
-    Node to search Qdrant using Hybrid Search and Late Interaction Re-ranking.
+    Node to embed the user query with one model ("dense", "sparse" or "colbert").
+    The three run side by side in a Parallel step; vectors go to shared["query_vectors"].
     """
+    def __init__(self, kind, cache=QUERY_VECTOR_CACHE, **kwargs):
+        super().__init__(cache=cache, **kwargs)
+        self.kind = kind
+
+    def cache_key(self, prep_res):
+        return super().cache_key((self.kind, prep_res))
+
     def prep(self, shared):
         return shared.get("user_query")
 
     def exec(self, user_query):
         if not user_query:
-            return []
+            return None
+        return embed_query(self.kind, user_query)
+
+    def post(self, shared, prep_res, exec_res):
+        shared.setdefault("query_vectors", {})[self.kind] = exec_res
+        return "default"
+
+class ReuseContextNode(EmbedQueryNode):
+    """
+    Node to answer a follow-up from the previous turn's chunks when its query is
+    close enough: embeds the (rewritten) query with the dense model only and
+    compares it with shared["previous_retrieval"] (see AnswerNode). Returns
+    "reuse" to skip the three-model embedding and the search, "default" otherwise.
+    The dense vector stays in shared["query_vectors"] for the search.
+    """
+    def __init__(self, **kwargs):
+        super().__init__("dense", **kwargs)
 
-        db_path = "./qdrant_db"
-        client = QdrantClient(path=db_path)
-        collection_name = "drive_docs_vn"
+    def post(self, shared, prep_res, exec_res):
+        shared.setdefault("query_vectors", {})["dense"] = exec_res
+        previous = shared.get("previous_retrieval")
+        if exec_res is None or not previous or not previous.get("points"):
+            return "default"
+        if sorted(previous.get("folder_ids") or []) != sorted(shared.get("folder_ids") or []):
+            return "default"
+
+        a, b = np.asarray(exec_res), np.asarray(previous["dense"])
+        similarity = float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b) or 1.0))
+        shared["reuse_similarity"] = similarity
+        if similarity < CONTEXT_REUSE_THRESHOLD:
+            return "default"
+
+        logger.info(f"Reusing the previous turn's {len(previous['points'])} chunks (similarity {similarity:.3f})")
+        shared["retrieved_context"] = previous["points"]
+        shared["context_reused"] = True
+        return "reuse"
 
-        # Get cached models
-        dense_model, sparse_model, colbert_model = get_embedding_models()
+class QdrantSearchNode(Node):
+    """
+    Node to search Qdrant using Hybrid Search and Late Interaction Re-ranking.
+    Expects the query vectors from the EmbedQueryNode step; shared["search_limit"]
+    overrides the number of results (5) and shared["folder_ids"] limits the
+    search to those Drive folders.
+    Results are cached per query and index generation (bumped by every
+    ingestion, in any process); each run gets its own copies of the points.
+    A failed search gives no context, or raises with raise_errors=True (for
+    callers that must tell failures from no matches).
+    """
+    def __init__(self, cache=SEARCH_CACHE, raise_errors=False, **kwargs):
+        super().__init__(cache=cache, **kwargs)
+        self.raise_errors = raise_errors
 
-        # Generate query embeddings
-        # Models expect list of strings
-        query_dense = list(dense_model.embed([user_query]))[0]
-        query_sparse = list(sparse_model.embed([user_query]))[0]
-        query_colbert = list(colbert_model.embed([user_query]))[0]
+    def cache_key(self, prep_res):
+        # The vectors are a function of the query text
+        user_query, _, limit, folder_ids = prep_res
+        return super().cache_key((user_query, limit, folder_ids, get_ingest_journal().index_generation()))
 
-        dense_vec = query_dense.tolist()
-        sparse_vec = SparseVector(**query_sparse.as_object())
-        colbert_vec = query_colbert.tolist()
+    def prep(self, shared):
+        folder_ids = tuple(sorted(set(shared.get("folder_ids") or [])))
+        return shared.get("user_query"), shared.get("query_vectors", {}), shared.get("search_limit", 5), folder_ids
 
-        try:
-             # Hybrid Search (Dense + Sparse) Prefetch
-             # We fetch more candidates to re-rank with ColBERT
-
-             results = client.query_points(
-                 collection_name=collection_name,
-                 prefetch=[
-                     # Prefetch with Dense
-                     Prefetch(
-                         query=dense_vec,
-                         using="dense",
-                         limit=20
-                     ),
-                     # Prefetch with Sparse
-                     Prefetch(
-                         query=sparse_vec,
-                         using="sparse",
-                         limit=20
-                     )
-                 ],
-                 # Main query using ColBERT to re-rank the prefetched results
-                 query=colbert_vec,
-                 using="colbert",
-                 limit=5
-             ).points
-
-             return results
-
-        except Exception as e:
-            logger.error(f"Search failed: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+    def exec(self, inputs):
+        user_query, query_vectors, limit, folder_ids = inputs
+        if not user_query:
             return []
 
+        return hybrid_search(user_query, limit=limit, query_vectors=query_vectors, folder_ids=list(folder_ids))
+
+    def exec_fallback(self, prep_res, exc):
+        # Failed searches return no context and are not cached
+        if self.raise_errors:
+            raise exc
+        logger.error(f"Search failed: {exc}", exc_info=exc)
+        return []
+
     def post(self, shared, prep_res, exec_res):
-        shared["retrieved_context"] = exec_res
+        # The cache keeps exec_res; callers fill in payload text, so each run gets its own copies
+        shared["retrieved_context"] = copy.deepcopy(exec_res)
         return "default"
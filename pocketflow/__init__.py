@@ -1,4 +1,51 @@
-import asyncio, warnings, copy, time
+import asyncio, warnings, copy, time, threading, hashlib, pickle, sqlite3, contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_MISS=(False,None)
+
+class MemoryCache:
+    """In-process LRU cache for node exec results, with optional TTL (seconds)."""
+    def __init__(self,maxsize=1024,ttl=None): self.maxsize,self.ttl,self.hits,self.misses,self._data,self._lock=maxsize,ttl,0,0,OrderedDict(),threading.Lock()
+    def get(self,key):
+        with self._lock:
+            item=self._data.get(key)
+            if item is None or (item[0] is not None and item[0]<time.monotonic()):
+                if item is not None: del self._data[key]
+                self.misses+=1; return _MISS
+            self._data.move_to_end(key); self.hits+=1; return True,item[1]
+    def set(self,key,value):
+        with self._lock:
+            self._data[key]=(time.monotonic()+self.ttl if self.ttl else None,value); self._data.move_to_end(key)
+            while len(self._data)>self.maxsize: self._data.popitem(last=False)
+    def clear(self):
+        with self._lock: self._data.clear()
+    def stats(self): return {"size":len(self._data),"hits":self.hits,"misses":self.misses}
+
+class DiskCache:
+    """SQLite-backed cache for node exec results (values pickled), shared across restarts."""
+    def __init__(self,path,maxsize=10000,ttl=None): self.path,self.maxsize,self.ttl,self.hits,self.misses,self._conn,self._lock=path,maxsize,ttl,0,0,None,threading.Lock()
+    def _db(self):
+        if self._conn is None:
+            self._conn=sqlite3.connect(self.path,check_same_thread=False); self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS node_cache (key TEXT PRIMARY KEY, expires REAL, used REAL, value BLOB)")
+        return self._conn
+    def get(self,key):
+        with self._lock:
+            db=self._db(); row=db.execute("SELECT expires, value FROM node_cache WHERE key=?",(key,)).fetchone()
+            if row is None or (row[0] is not None and row[0]<time.time()):
+                if row is not None: db.execute("DELETE FROM node_cache WHERE key=?",(key,)); db.commit()
+                self.misses+=1; return _MISS
+            db.execute("UPDATE node_cache SET used=? WHERE key=?",(time.time(),key)); db.commit(); self.hits+=1; return True,pickle.loads(row[1])
+    def set(self,key,value):
+        with self._lock:
+            db=self._db(); now=time.time()
+            db.execute("INSERT OR REPLACE INTO node_cache VALUES (?,?,?,?)",(key,now+self.ttl if self.ttl else None,now,pickle.dumps(value)))
+            db.execute("DELETE FROM node_cache WHERE key IN (SELECT key FROM node_cache ORDER BY used DESC LIMIT -1 OFFSET ?)",(self.maxsize,)); db.commit()
+    def clear(self):
+        with self._lock: self._db().execute("DELETE FROM node_cache"); self._db().commit()
+    def stats(self):
+        with self._lock: return {"size":self._db().execute("SELECT COUNT(*) FROM node_cache").fetchone()[0],"hits":self.hits,"misses":self.misses}
 
 class BaseNode:
     def __init__(self): self.params,self.successors={},{}
@@ -24,14 +71,26 @@ class _ConditionalTransition:
     def __rshift__(self,tgt): return self.src.next(tgt,self.action)
 
 class Node(BaseNode):
-    def __init__(self,max_retries=1,wait=0): super().__init__(); self.max_retries,self.wait=max_retries,wait
+    def __init__(self,max_retries=1,wait=0,cache=None): super().__init__(); self.max_retries,self.wait,self.cache,self.cache_hit=max_retries,wait,cache,None
     def exec_fallback(self,prep_res,exc): raise exc
+    def cache_key(self,prep_res):
+        try: return hashlib.sha256(pickle.dumps((type(self).__qualname__,prep_res),4)).hexdigest()
+        except Exception: return None
+    def _cache_get(self,prep_res):
+        key=self.cache_key(prep_res) if self.cache is not None else None
+        if key is None: return None,_MISS
+        hit=self.cache.get(key); self.cache_hit=hit[0]; return key,hit
     def _exec(self,prep_res):
+        key,(hit,res)=self._cache_get(prep_res)
+        if hit: return res
         for self.cur_retry in range(self.max_retries):
-            try: return self.exec(prep_res)
+            try: res=self.exec(prep_res)
             except Exception as e:
                 if self.cur_retry==self.max_retries-1: return self.exec_fallback(prep_res,e)
                 if self.wait>0: time.sleep(self.wait)
+            else:
+                if key is not None: self.cache.set(key,res)
+                return res
 
 class BatchNode(Node):
     def _exec(self,items): return [super(BatchNode,self)._exec(i) for i in (items or [])]
@@ -56,17 +115,40 @@ class BatchFlow(Flow):
         for bp in pr: self._orch(shared,{**self.params,**bp})
         return self.post(shared,pr,None)
 
+class Parallel(BaseNode):
+    """Fan-out/fan-in step: member preps run in order, execs concurrently on threads, posts in declared order."""
+    def __init__(self,*nodes,max_workers=None):
+        super().__init__()
+        if any(isinstance(n,Flow) for n in nodes): raise TypeError("Parallel members must be nodes, not flows")
+        self.nodes,self.max_workers=list(nodes),max_workers
+    def _members(self,params):
+        nodes=[copy.copy(n) for n in self.nodes]
+        for n in nodes: n.set_params(params)
+        return nodes
+    def _orch(self,shared,params=None):
+        nodes=self._members(params or {**self.params}); preps=[n.prep(shared) for n in nodes]
+        with ThreadPoolExecutor(self.max_workers or len(nodes) or 1) as ex: futs=[ex.submit(contextvars.copy_context().run,n._exec,p) for n,p in zip(nodes,preps)]
+        execs=[f.result() for f in futs]  # First failure in declared order propagates
+        for n,p,e in zip(nodes,preps,execs): n.post(shared,p,e)
+        return execs
+    def _run(self,shared): p=self.prep(shared); o=self._orch(shared); return self.post(shared,p,o)
+
 class AsyncNode(Node):
     async def prep_async(self,shared): pass
     async def exec_async(self,prep_res): pass
     async def exec_fallback_async(self,prep_res,exc): raise exc
     async def post_async(self,shared,prep_res,exec_res): pass
     async def _exec(self,prep_res): 
+        key,(hit,res)=self._cache_get(prep_res)
+        if hit: return res
         for self.cur_retry in range(self.max_retries):
-            try: return await self.exec_async(prep_res)
+            try: res=await self.exec_async(prep_res)
             except Exception as e:
                 if self.cur_retry==self.max_retries-1: return await self.exec_fallback_async(prep_res,e)
                 if self.wait>0: await asyncio.sleep(self.wait)
+            else:
+                if key is not None: self.cache.set(key,res)
+                return res
     async def run_async(self,shared): 
         if self.successors: warnings.warn("Node won't run successors. Use AsyncFlow.")  
         return await self._run_async(shared)
@@ -97,4 +179,14 @@ class AsyncParallelBatchFlow(AsyncFlow,BatchFlow):
     async def _run_async(self,shared): 
         pr=await self.prep_async(shared) or []
         await asyncio.gather(*(self._orch_async(shared,{**self.params,**bp}) for bp in pr))
-        return await self.post_async(shared,pr,None)
\ No newline at end of file
+        return await self.post_async(shared,pr,None)
+class AsyncParallel(Parallel,AsyncNode):
+    """Parallel for async flows: async members run as tasks, sync members on the default executor."""
+    async def _orch_async(self,shared,params=None):
+        nodes,loop=self._members(params or {**self.params}),asyncio.get_running_loop(); preps=[await n.prep_async(shared) if isinstance(n,AsyncNode) else n.prep(shared) for n in nodes]
+        execs=await asyncio.gather(*(n._exec(p) if isinstance(n,AsyncNode) else loop.run_in_executor(None,contextvars.copy_context().run,n._exec,p) for n,p in zip(nodes,preps)),return_exceptions=True)
+        for e in execs:
+            if isinstance(e,BaseException): raise e
+        for n,p,e in zip(nodes,preps,execs): await n.post_async(shared,p,e) if isinstance(n,AsyncNode) else n.post(shared,p,e)
+        return execs
+    async def _run_async(self,shared): p=await self.prep_async(shared); o=await self._orch_async(shared); return await self.post_async(shared,p,o)
@@ -0,0 +1,209 @@
+"""
+HTTP query service over the retrieval flow, for other services to call.
+
+    python server.py
+
+    POST /search   {"query": "...", "limit": 5}  -> {"results": [...]}
+    POST /answer   {"query": "..."}              -> NDJSON stream:
+                   {"sources": [...]}, then {"delta": "..."} per piece of the
+                   answer, then {"done": true, "context_tokens": ...}; if
+                   generation fails, the last line is {"error": "..."} instead
+    GET  /health
+
+Both POST endpoints take an optional "folder_ids" list to search only the
+documents ingested from those Drive folders.
+"""
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import os
+
+load_dotenv()
+
+from flow import get_search_flow
+from nodes import answer_context, answer_prompt
+from utils.call_llm import stream_llm
+from utils.vector_store import hydrate_chunk_text, get_qdrant_client
+from utils.embedding_models import get_registry
+from utils.chunking import get_chunk_tokenizer
+from utils.embedding_service import EMBEDDING_SERVER
+
+logger = logging.getLogger(__name__)
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+# Requests handled at once (an /answer holds its slot until the stream ends);
+# further requests wait up to SERVER_QUEUE_TIMEOUT seconds, then get a 503
+SERVER_MAX_CONCURRENCY = int(os.getenv("SERVER_MAX_CONCURRENCY", "32"))
+SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "5"))
+# Seconds an idle client connection is kept open for its next request
+SERVER_KEEP_ALIVE = int(os.getenv("SERVER_KEEP_ALIVE", "75"))
+
+# Maximum chunks returned by /search
+MAX_SEARCH_RESULTS = 20
+
+# Blocking work (embedding, Qdrant, Gemini) runs on this pool, never on the event loop
+_executor = ThreadPoolExecutor(SERVER_MAX_CONCURRENCY, thread_name_prefix="query")
+_slots = asyncio.Semaphore(SERVER_MAX_CONCURRENCY)
+
+class Busy(Exception):
+    pass
+
+async def acquire_slot():
+    try:
+        await asyncio.wait_for(_slots.acquire(), SERVER_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise Busy()
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+class SlotStreamingResponse(StreamingResponse):
+    """Streams the body, then releases the request's slot (also on disconnect)."""
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            _slots.release()
+
+def _search(query, limit, folder_ids):
+    shared = {"user_query": query, "search_limit": limit, "folder_ids": folder_ids}
+    get_search_flow().run(shared)
+    points = shared.get("retrieved_context", [])
+    hydrate_chunk_text(points)
+    return points
+
+def _point_json(p):
+    payload = p.payload or {}
+    return {
+        "file_id": payload.get("file_id"),
+        "source": payload.get("source"),
+        "sources": payload.get("sources", [payload.get("source")]),
+        "chunk_index": payload.get("chunk_index"),
+        "score": p.score,
+        "text": payload.get("text", ""),
+    }
+
+async def _read_query(request: Request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None, {}
+    query = body.get("query") if isinstance(body, dict) else None
+    if not isinstance(query, str) or not query.strip():
+        return None, {}
+    return query.strip(), body
+
+def _folder_ids(body):
+    folder_ids = body.get("folder_ids") or []
+    if not isinstance(folder_ids, list) or not all(isinstance(f, str) for f in folder_ids):
+        raise ValueError('"folder_ids" must be a list of folder ID strings.')
+    return folder_ids
+
+def _error(status, message):
+    return JSONResponse({"error": message}, status_code=status)
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+async def search(request: Request):
+    query, body = await _read_query(request)
+    if query is None:
+        return _error(400, 'Body must be JSON with a non-empty "query".')
+    try:
+        limit = max(1, min(int(body.get("limit", 5)), MAX_SEARCH_RESULTS))
+    except (TypeError, ValueError):
+        return _error(400, '"limit" must be an integer.')
+    try:
+        folder_ids = _folder_ids(body)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    try:
+        await acquire_slot()
+    except Busy:
+        return _error(503, "Server busy, retry later.")
+    try:
+        points = await run_blocking(_search, query, limit, folder_ids)
+    except Exception as e:
+        logger.exception("Search failed")
+        return _error(500, f"Search failed: {e}")
+    finally:
+        _slots.release()
+
+    return JSONResponse({"query": query, "results": [_point_json(p) for p in points]})
+
+async def answer(request: Request):
+    query, body = await _read_query(request)
+    if query is None:
+        return _error(400, 'Body must be JSON with a non-empty "query".')
+    try:
+        folder_ids = _folder_ids(body)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    try:
+        await acquire_slot()
+    except Busy:
+        return _error(503, "Server busy, retry later.")
+    try:
+        points = await run_blocking(_search, query, 5, folder_ids)
+        context_text, stats = await run_blocking(answer_context, query, points)
+    except Exception as e:
+        _slots.release()
+        logger.exception("Retrieval failed")
+        return _error(500, f"Retrieval failed: {e}")
+
+    async def lines():
+        yield json.dumps({"sources": [_point_json(p) for p in points]}, ensure_ascii=False) + "\n"
+        pieces = stream_llm(answer_prompt(query, context_text))
+        try:
+            while True:
+                piece = await run_blocking(next, pieces, None)
+                if piece is None:
+                    break
+                yield json.dumps({"delta": piece}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # The 200 status is already sent: end the stream with an error line, not "done"
+            logger.exception("Answer generation failed")
+            yield json.dumps({"error": f"Answer generation failed: {e}"}, ensure_ascii=False) + "\n"
+            return
+        yield json.dumps({"done": True, "context_tokens": stats["context_tokens"]}) + "\n"
+
+    # The slot is held until the whole answer has been streamed
+    return SlotStreamingResponse(lines(), media_type="application/x-ndjson")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load embedding models and open the index before the first request arrives
+    if not EMBEDDING_SERVER:
+        get_registry().warm_up(background=True)
+    # Tokenizer only (not the model), for counting answer context tokens
+    get_chunk_tokenizer()
+    get_qdrant_client()
+    get_search_flow()
+    yield
+    _executor.shutdown(wait=False)
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/search", search, methods=["POST"]),
+        Route("/answer", answer, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # One process: local Qdrant (path mode) can only be opened once; set
+    # QDRANT_URL to run several servers behind a load balancer
+    uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT, timeout_keep_alive=SERVER_KEEP_ALIVE)
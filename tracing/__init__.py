@@ -3,11 +3,13 @@ PocketFlow Tracing Module
 
 This module provides observability and tracing capabilities for PocketFlow workflows
 using Langfuse as the backend. It includes decorators and utilities to automatically
-trace node execution, inputs, and outputs.
+trace node execution, inputs, and outputs, plus an in-process metrics
+registry that works without any backend.
 """
 
 from .config import TracingConfig
 from .core import LangfuseTracer
 from .decorator import trace_flow
+from .metrics import MetricsRegistry, get_metrics
 
-__all__ = ["trace_flow", "TracingConfig", "LangfuseTracer"]
+__all__ = ["trace_flow", "TracingConfig", "LangfuseTracer", "MetricsRegistry", "get_metrics"]
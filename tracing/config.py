@@ -3,11 +3,26 @@ Configuration module for PocketFlow tracing with Langfuse.
 """
 
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 
+def _split_list(value: Optional[str]) -> List[str]:
+    """Parse a comma-separated environment variable into a list."""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def _parse_rates(value: Optional[str]) -> Dict[str, float]:
+    """Parse "Name=0.1,Other=1" into {"Name": 0.1, "Other": 1.0}."""
+    rates = {}
+    for item in _split_list(value):
+        name, _, rate = item.partition("=")
+        if rate:
+            rates[name.strip()] = float(rate)
+    return rates
+
+
 @dataclass
 class   TracingConfig:
     """Configuration class for PocketFlow tracing with Langfuse."""
@@ -26,6 +41,29 @@ class   TracingConfig:
     trace_post: bool = True
     trace_errors: bool = True
     
+    # Sampling: head-based rates (global, per flow name, per node class name),
+    # always keep failed runs, and optionally keep only runs slower than a threshold
+    sample_rate: float = 1.0
+    flow_sample_rates: Dict[str, float] = field(default_factory=dict)
+    node_sample_rates: Dict[str, float] = field(default_factory=dict)
+    always_sample_errors: bool = True
+    latency_threshold_ms: Optional[float] = None
+    
+    # Serialization limits for traced inputs/outputs
+    max_field_length: int = 2000
+    max_collection_items: int = 20
+    max_depth: int = 4
+    field_allowlist: Optional[List[str]] = None
+    field_denylist: List[str] = field(default_factory=list)
+    
+    # In-process metrics (tracing.metrics), independent of Langfuse
+    metrics_enabled: bool = True
+    
+    # Background export configuration
+    export_queue_size: int = 10000
+    export_batch_size: int = 100
+    export_flush_interval: float = 1.0
+    
     # Session configuration
     session_id: Optional[str] = None
     user_id: Optional[str] = None
@@ -59,6 +97,22 @@ class   TracingConfig:
             trace_exec=os.getenv("POCKETFLOW_TRACE_EXEC", "true").lower() == "true",
             trace_post=os.getenv("POCKETFLOW_TRACE_POST", "true").lower() == "true",
             trace_errors=os.getenv("POCKETFLOW_TRACE_ERRORS", "true").lower() == "true",
+            sample_rate=float(os.getenv("POCKETFLOW_TRACE_SAMPLE_RATE", "1.0")),
+            flow_sample_rates=_parse_rates(os.getenv("POCKETFLOW_TRACE_FLOW_SAMPLE_RATES")),
+            node_sample_rates=_parse_rates(os.getenv("POCKETFLOW_TRACE_NODE_SAMPLE_RATES")),
+            always_sample_errors=os.getenv("POCKETFLOW_TRACE_ALWAYS_ON_ERROR", "true").lower() == "true",
+            latency_threshold_ms=float(os.environ["POCKETFLOW_TRACE_LATENCY_THRESHOLD_MS"])
+            if os.getenv("POCKETFLOW_TRACE_LATENCY_THRESHOLD_MS")
+            else None,
+            max_field_length=int(os.getenv("POCKETFLOW_TRACE_MAX_FIELD_LENGTH", "2000")),
+            max_collection_items=int(os.getenv("POCKETFLOW_TRACE_MAX_ITEMS", "20")),
+            max_depth=int(os.getenv("POCKETFLOW_TRACE_MAX_DEPTH", "4")),
+            field_allowlist=_split_list(os.getenv("POCKETFLOW_TRACE_ALLOW_FIELDS")) or None,
+            field_denylist=_split_list(os.getenv("POCKETFLOW_TRACE_DENY_FIELDS")),
+            metrics_enabled=os.getenv("POCKETFLOW_METRICS", "true").lower() == "true",
+            export_queue_size=int(os.getenv("POCKETFLOW_TRACE_QUEUE_SIZE", "10000")),
+            export_batch_size=int(os.getenv("POCKETFLOW_TRACE_BATCH_SIZE", "100")),
+            export_flush_interval=float(os.getenv("POCKETFLOW_TRACE_FLUSH_INTERVAL", "1.0")),
             session_id=os.getenv("POCKETFLOW_SESSION_ID"),
             user_id=os.getenv("POCKETFLOW_USER_ID"),
         )
@@ -5,6 +5,7 @@ Core tracing functionality for PocketFlow with Langfuse integration.
 import json
 import time
 import uuid
+from contextvars import ContextVar
 from typing import Any, Dict, Optional, Union
 from datetime import datetime
 
@@ -17,26 +18,51 @@ except ImportError:
     print("Warning: langfuse package not installed. Install with: pip install langfuse")
 
 from .config import TracingConfig
+from .exporter import BackgroundExporter
+from .sampling import BUFFER, ERRORS, RunSampling, keep_run, sample_node, start_run, trace_phase
+from .serialize import TraceSerializer
+
+# Per-run trace context. Each thread and asyncio task sees its own values, so
+# concurrent flows sharing one tracer never overwrite each other's state.
+_current_trace_id: ContextVar[Optional[str]] = ContextVar("pocketflow_trace_id", default=None)
+_current_parent_id: ContextVar[Optional[str]] = ContextVar("pocketflow_parent_span_id", default=None)
+_trace_scopes: ContextVar[tuple] = ContextVar("pocketflow_trace_scopes", default=())
+_current_run: ContextVar[Optional[RunSampling]] = ContextVar("pocketflow_trace_run", default=None)
+# Sampling decision of the node run in progress, shared by its prep/exec/post spans
+_current_node_sampled: ContextVar[Optional[bool]] = ContextVar("pocketflow_trace_node_sampled", default=None)
 
 
 class LangfuseTracer:
     """
     Core tracer class that handles Langfuse integration for PocketFlow.
+
+    Langfuse calls run on a background exporter; the public methods only
+    serialize their data and enqueue the call.
     """
 
-    def __init__(self, config: TracingConfig):
+    def __init__(self, config: TracingConfig, client: Any = None):
         """
         Initialize the LangfuseTracer.
 
         Args:
             config: TracingConfig instance with Langfuse settings.
+            client: Optional pre-built client exposing the Langfuse v2 API
+                (e.g. a local fake collector). Skips Langfuse initialization.
         """
         self.config = config
-        self.client = None
-        self.current_trace = None
-        self.spans = {}  # Store spans by node ID
-
-        if LANGFUSE_AVAILABLE and config.validate():
+        self.client = client
+        self.exporter = None
+        self.spans = {}  # Open span IDs -> context token restoring the previous parent
+        self.serializer = TraceSerializer(
+            max_string_length=config.max_field_length,
+            max_items=config.max_collection_items,
+            max_depth=config.max_depth,
+            allow_fields=config.field_allowlist,
+            deny_fields=config.field_denylist,
+        )
+        self._remote = {}  # Trace/span handles, only touched by the exporter thread
+
+        if client is None and LANGFUSE_AVAILABLE and config.validate():
             try:
                 # Initialize Langfuse client with proper parameters
                 kwargs = {}
@@ -58,17 +84,55 @@ class LangfuseTracer:
                 if config.debug:
                     print(f"✗ Failed to initialize Langfuse client: {e}")
                 self.client = None
-        else:
+        elif client is None:
             if config.debug:
                 print("✗ Langfuse not available or configuration invalid")
 
-    def start_trace(self, flow_name: str, input_data: Dict[str, Any]) -> Optional[str]:
+        if self.client:
+            self.exporter = BackgroundExporter(
+                max_queue_size=config.export_queue_size,
+                batch_size=config.export_batch_size,
+                flush_interval=config.export_flush_interval,
+                on_flush=self.client.flush,
+                debug=config.debug,
+            )
+
+    @property
+    def current_trace(self) -> Optional[str]:
+        """ID of the trace active in the current context (thread or task), if any."""
+        return _current_trace_id.get()
+
+    def is_recording(self) -> bool:
+        """Whether node spans are recorded in the current context."""
+        return _current_trace_id.get() is not None
+
+    def _emit(self, fn, *args) -> None:
+        """Export a call, or hold it in the buffer of a run awaiting its tail decision."""
+        run = _current_run.get()
+        if run is not None and run.buffer is not None:
+            run.buffer.append((fn, args))
+        else:
+            self.exporter.submit(fn, *args)
+
+    def start_trace(
+        self,
+        flow_name: str,
+        input_data: Dict[str, Any],
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> Optional[str]:
         """
         Start a new trace for a flow execution.
 
+        If a trace is already active in the current context, the flow is
+        recorded as a span nested under the current span instead. Root runs
+        are sampled according to the config; unsampled runs return None.
+
         Args:
             flow_name: Name of the flow being traced.
             input_data: Input data for the flow.
+            session_id: Session ID for this run. Defaults to config.session_id.
+            user_id: User ID for this run. Defaults to config.user_id.
 
         Returns:
             Trace ID if successful, None otherwise.
@@ -76,25 +140,73 @@ class LangfuseTracer:
         if not self.client:
             return None
 
+        parent_trace_id = _current_trace_id.get()
+        if not parent_trace_id and _current_run.get() is not None:
+            # Sub-flow of an unsampled run
+            _trace_scopes.set(_trace_scopes.get() + ((None, None, None, None, None),))
+            return None
+
         try:
+            if not parent_trace_id:
+                run = start_run(self.config, flow_name)
+                if not run.recording:
+                    run.trace_info = dict(
+                        name=flow_name,
+                        session_id=session_id or self.config.session_id,
+                        user_id=user_id or self.config.user_id,
+                    )
+                    scope = (None, None, None, None, _current_run.set(run))
+                    _trace_scopes.set(_trace_scopes.get() + (scope,))
+                    return None
+
             # Serialize input data safely
             serialized_input = self._serialize_data(input_data)
 
-            # Use Langfuse v2 API to create a trace
-            self.current_trace = self.client.trace(
-                name=flow_name,
-                input=serialized_input,
-                metadata={
-                    "framework": "PocketFlow",
-                    "trace_type": "flow_execution",
-                    "timestamp": datetime.now().isoformat(),
-                },
-                session_id=self.config.session_id,
-                user_id=self.config.user_id,
-            )
+            if parent_trace_id:
+                # Sub-flow: a span of the enclosing trace
+                trace_id = parent_trace_id
+                span_id = str(uuid.uuid4())
+                start_time = datetime.now()
+                self._emit(
+                    self._export_span,
+                    trace_id,
+                    _current_parent_id.get(),
+                    span_id,
+                    dict(
+                        name=flow_name,
+                        input=serialized_input,
+                        metadata={"trace_type": "sub_flow_execution"},
+                        start_time=start_time,
+                    ),
+                )
+                scope = (trace_id, span_id, None, _current_parent_id.set(span_id), None)
+            else:
+                trace_id = str(uuid.uuid4())
+                run_token = _current_run.set(run)
+                self._emit(
+                    self._export_trace,
+                    trace_id,
+                    dict(
+                        name=flow_name,
+                        input=serialized_input,
+                        metadata={
+                            "framework": "PocketFlow",
+                            "trace_type": "flow_execution",
+                            "timestamp": datetime.now().isoformat(),
+                        },
+                        session_id=session_id or self.config.session_id,
+                        user_id=user_id or self.config.user_id,
+                    ),
+                )
+                scope = (
+                    trace_id,
+                    None,
+                    _current_trace_id.set(trace_id),
+                    _current_parent_id.set(None),
+                    run_token,
+                )
 
-            # Get the trace ID
-            trace_id = self.current_trace.id
+            _trace_scopes.set(_trace_scopes.get() + (scope,))
 
             if self.config.debug:
                 print(f"✓ Started trace: {trace_id} for flow: {flow_name}")
@@ -108,28 +220,49 @@ class LangfuseTracer:
 
     def end_trace(self, output_data: Dict[str, Any], status: str = "success") -> None:
         """
-        End the current trace.
+        End the innermost trace (or sub-flow span) started in the current context.
 
         Args:
             output_data: Output data from the flow.
             status: Status of the trace execution.
         """
-        if not self.current_trace:
+        scopes = _trace_scopes.get()
+        if not scopes:
+            return
+
+        trace_id, span_id, trace_token, parent_token, run_token = scopes[-1]
+        run = _current_run.get() if run_token is not None else None
+
+        if trace_id is None:
+            # Unsampled run: only a failed root run is exported, as a bare trace
+            _trace_scopes.set(scopes[:-1])
+            if run is not None:
+                _current_run.reset(run_token)
+                if run.mode == ERRORS and status == "error":
+                    self._export_error_run(run, output_data)
             return
 
         try:
             # Serialize output data safely
             serialized_output = self._serialize_data(output_data)
-
-            # Update the trace with output data using v2 API
-            self.current_trace.update(
+            end_time = datetime.now()
+            update_data = dict(
                 output=serialized_output,
                 metadata={
                     "status": status,
-                    "end_timestamp": datetime.now().isoformat(),
+                    "end_timestamp": end_time.isoformat(),
                 },
             )
 
+            if span_id:
+                self._emit(self._export_span_end, span_id, update_data, end_time)
+            else:
+                self._emit(self._export_trace_end, trace_id, update_data)
+
+            if run is not None and run.mode == BUFFER and keep_run(self.config, run, status):
+                for fn, args in run.buffer:
+                    self.exporter.submit(fn, *args)
+
             if self.config.debug:
                 print(f"✓ Ended trace with status: {status}")
 
@@ -137,41 +270,122 @@ class LangfuseTracer:
             if self.config.debug:
                 print(f"✗ Failed to end trace: {e}")
         finally:
-            self.current_trace = None
-            self.spans.clear()
+            _trace_scopes.set(scopes[:-1])
+            _current_parent_id.reset(parent_token)
+            if trace_token is not None:
+                _current_trace_id.reset(trace_token)
+            if run_token is not None:
+                _current_run.reset(run_token)
+
+    def _export_error_run(self, run: RunSampling, output_data: Dict[str, Any]) -> None:
+        """Export a failed run that was not head-sampled, without node spans."""
+        try:
+            trace_id = str(uuid.uuid4())
+            self.exporter.submit(
+                self._export_trace,
+                trace_id,
+                dict(
+                    metadata={
+                        "framework": "PocketFlow",
+                        "trace_type": "flow_execution",
+                        "sampling": "error",
+                        "timestamp": datetime.now().isoformat(),
+                    },
+                    **run.trace_info,
+                ),
+            )
+            self.exporter.submit(
+                self._export_trace_end,
+                trace_id,
+                dict(
+                    output=self._serialize_data(output_data),
+                    metadata={
+                        "status": "error",
+                        "duration_ms": run.duration_ms,
+                        "end_timestamp": datetime.now().isoformat(),
+                    },
+                ),
+            )
+        except Exception as e:
+            if self.config.debug:
+                print(f"✗ Failed to export failed run: {e}")
+
+    def start_node_run(self, node_name: str):
+        """
+        Sample one run of a node, so its phases are recorded all or not at all.
+
+        Returns a token for end_node_run, or None if no trace is active.
+        """
+        if not _current_trace_id.get():
+            return None
+        return _current_node_sampled.set(sample_node(self.config, node_name))
+
+    def sample_member(self, node_name: str) -> Optional[bool]:
+        """
+        Sample one run of a Parallel member, which runs its phases without
+        going through _run. The caller keeps the decision on the member copy.
+        """
+        if not _current_trace_id.get():
+            return None
+        return sample_node(self.config, node_name)
+
+    def end_node_run(self, token) -> None:
+        """Restore the enclosing node run's sampling decision."""
+        if token is not None:
+            _current_node_sampled.reset(token)
 
     def start_node_span(
-        self, node_name: str, node_id: str, phase: str
+        self, node_name: str, node_id: str, phase: str, sampled: Optional[bool] = None
     ) -> Optional[str]:
         """
         Start a span for a node execution phase.
 
+        The span becomes the parent of spans started inside the phase
+        (e.g. a sub-flow run from exec) until end_node_span is called.
+
         Args:
             node_name: Name/type of the node.
             node_id: Unique identifier for the node instance.
             phase: Execution phase (prep, exec, post).
+            sampled: The node's own sampling decision, if it made one outside
+                a node run (Parallel members); else the current run's is used.
 
         Returns:
             Span ID if successful, None otherwise.
         """
-        if not self.current_trace:
+        trace_id = _current_trace_id.get()
+        if not trace_id or not trace_phase(self.config, phase):
+            return None
+        if sampled is None:
+            sampled = _current_node_sampled.get()
+        if sampled is None:
+            # A phase called outside a node run (e.g. node.prep() directly)
+            sampled = sample_node(self.config, node_name)
+        if not sampled:
             return None
 
         try:
-            span_id = f"{node_id}_{phase}"
-
-            # Create a child span using v2 API
-            span = self.current_trace.span(
-                name=f"{node_name}.{phase}",
-                metadata={
-                    "node_type": node_name,
-                    "node_id": node_id,
-                    "phase": phase,
-                    "start_timestamp": datetime.now().isoformat(),
-                },
+            span_id = str(uuid.uuid4())
+            start_time = datetime.now()
+
+            self._emit(
+                self._export_span,
+                trace_id,
+                _current_parent_id.get(),
+                span_id,
+                dict(
+                    name=f"{node_name}.{phase}",
+                    metadata={
+                        "node_type": node_name,
+                        "node_id": node_id,
+                        "phase": phase,
+                        "start_timestamp": start_time.isoformat(),
+                    },
+                    start_time=start_time,
+                ),
             )
 
-            self.spans[span_id] = span
+            self.spans[span_id] = _current_parent_id.set(span_id)
 
             if self.config.debug:
                 print(f"✓ Started span: {span_id}")
@@ -199,11 +413,12 @@ class LangfuseTracer:
             output_data: Output data from the phase.
             error: Exception if the phase failed.
         """
-        if span_id not in self.spans:
+        parent_token = self.spans.pop(span_id, None) if span_id else None
+        if parent_token is None:
             return
 
         try:
-            span = self.spans[span_id]
+            end_time = datetime.now()
 
             # Prepare update data
             update_data = {}
@@ -221,7 +436,7 @@ class LangfuseTracer:
                         "metadata": {
                             "error_type": type(error).__name__,
                             "error_message": str(error),
-                            "end_timestamp": datetime.now().isoformat(),
+                            "end_timestamp": end_time.isoformat(),
                         },
                     }
                 )
@@ -229,15 +444,11 @@ class LangfuseTracer:
                 update_data.update(
                     {
                         "level": "DEFAULT",
-                        "metadata": {"end_timestamp": datetime.now().isoformat()},
+                        "metadata": {"end_timestamp": end_time.isoformat()},
                     }
                 )
 
-            # Update the span with all data at once
-            span.update(**update_data)
-
-            # End the span
-            span.end()
+            self._emit(self._export_span_end, span_id, update_data, end_time)
 
             if self.config.debug:
                 status = "ERROR" if error else "SUCCESS"
@@ -247,12 +458,11 @@ class LangfuseTracer:
             if self.config.debug:
                 print(f"✗ Failed to end span: {e}")
         finally:
-            if span_id in self.spans:
-                del self.spans[span_id]
+            _current_parent_id.reset(parent_token)
 
     def _serialize_data(self, data: Any) -> Any:
         """
-        Safely serialize data for Langfuse.
+        Safely serialize data for Langfuse, within the configured size limits.
 
         Args:
             data: Data to serialize.
@@ -261,27 +471,54 @@ class LangfuseTracer:
             Serialized data that can be sent to Langfuse.
         """
         try:
-            # Handle JSON-serializable types first (keep as-is for nice UI rendering)
-            if isinstance(data, (dict, list, str, int, float, bool, type(None))):
-                return data
-            # Handle objects with __dict__ attribute
-            elif hasattr(data, "__dict__"):
-                # Convert objects to dict representation
-                return {"_type": type(data).__name__, "_data": str(data)}
-            else:
-                # Fallback to string representation
-                return {"_type": type(data).__name__, "_data": str(data)}
+            return self.serializer.serialize(data)
         except Exception:
             # Ultimate fallback
             return {"_type": "unknown", "_data": "<serialization_failed>"}
 
-    def flush(self) -> None:
-        """Flush any pending traces to Langfuse."""
-        if self.client:
-            try:
-                self.client.flush()
+    # Export calls below run on the exporter thread, in submission order.
+
+    def _export_trace(self, trace_id: str, kwargs: Dict[str, Any]) -> None:
+        self._remote[trace_id] = self.client.trace(id=trace_id, **kwargs)
+
+    def _export_trace_end(self, trace_id: str, kwargs: Dict[str, Any]) -> None:
+        trace = self._remote.pop(trace_id, None)
+        if trace is not None:
+            trace.update(**kwargs)
+
+    def _export_span(
+        self, trace_id: str, parent_id: Optional[str], span_id: str, kwargs: Dict[str, Any]
+    ) -> None:
+        parent = self._remote.get(parent_id) if parent_id else None
+        if parent is None:
+            parent = self._remote.get(trace_id)
+        if parent is not None:
+            self._remote[span_id] = parent.span(**kwargs)
+
+    def _export_span_end(self, span_id: str, update_data: Dict[str, Any], end_time: datetime) -> None:
+        span = self._remote.pop(span_id, None)
+        if span is not None:
+            span.update(**update_data)
+            span.end(end_time=end_time)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Block until queued traces are exported and flushed to Langfuse.
+
+        Flow runs do not call this; the exporter flushes in the background
+        and on interpreter exit.
+
+        Args:
+            timeout: Maximum seconds to wait. None waits indefinitely.
+        """
+        if self.exporter:
+            if self.exporter.flush(timeout):
                 if self.config.debug:
                     print("✓ Flushed traces to Langfuse")
-            except Exception as e:
-                if self.config.debug:
-                    print(f"✗ Failed to flush traces: {e}")
+            elif self.config.debug:
+                print("✗ Timed out flushing traces")
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Flush pending traces and stop the background exporter."""
+        if self.exporter:
+            self.exporter.shutdown(timeout)
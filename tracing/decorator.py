@@ -4,18 +4,23 @@ Decorator for tracing PocketFlow workflows with Langfuse.
 
 import functools
 import inspect
+import time
 import uuid
 from typing import Any, Callable, Dict, Optional, Union
 
+from pocketflow import Flow, BatchFlow, AsyncFlow, Parallel, AsyncParallel
+
 from .config import TracingConfig
 from .core import LangfuseTracer
+from .metrics import metrics
 
 
 def trace_flow(
     config: Optional[TracingConfig] = None,
     flow_name: Optional[str] = None,
     session_id: Optional[str] = None,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    tracer: Optional[LangfuseTracer] = None
 ):
     """
     Decorator to add Langfuse tracing to PocketFlow flows.
@@ -26,11 +31,16 @@ def trace_flow(
     - Input and output data for each phase
     - Errors and exceptions
     
+    Phase durations, errors, retries and payload sizes are also recorded in
+    the in-process metrics registry (tracing.metrics), with or without Langfuse.
+    
     Args:
         config: TracingConfig instance. If None, loads from environment.
         flow_name: Custom name for the flow. If None, uses the flow class name.
         session_id: Session ID for grouping related traces.
         user_id: User ID for the trace.
+        tracer: Pre-built tracer to use (e.g. one with a local fake client).
+            If None, one is created from config.
         
     Returns:
         Decorated flow class or function.
@@ -55,19 +65,19 @@ def trace_flow(
     def decorator(flow_class_or_func):
         # Handle both class and function decoration
         if inspect.isclass(flow_class_or_func):
-            return _trace_flow_class(flow_class_or_func, config, flow_name, session_id, user_id)
+            return _trace_flow_class(flow_class_or_func, config, flow_name, session_id, user_id, tracer)
         else:
-            return _trace_flow_function(flow_class_or_func, config, flow_name, session_id, user_id)
+            return _trace_flow_function(flow_class_or_func, config, flow_name, session_id, user_id, tracer)
     
     return decorator
 
 
-def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
+def _trace_flow_class(flow_class, config, flow_name, session_id, user_id, tracer=None):
     """Trace a Flow class by wrapping its methods."""
     
     # Get or create config
     if config is None:
-        config = TracingConfig.from_env()
+        config = tracer.config if tracer else TracingConfig.from_env()
     
     # Override session/user if provided
     if session_id:
@@ -79,6 +89,10 @@ def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
     if flow_name is None:
         flow_name = flow_class.__name__
     
+    # One tracer (and background exporter) shared by all instances of the class
+    if tracer is None:
+        tracer = LangfuseTracer(config)
+    
     # Store original methods
     original_init = flow_class.__init__
     original_run = getattr(flow_class, 'run', None)
@@ -90,9 +104,8 @@ def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
         original_init(self, *args, **kwargs)
         
         # Add tracing attributes
-        self._tracer = LangfuseTracer(config)
+        self._tracer = tracer
         self._flow_name = flow_name
-        self._trace_id = None
         
         # Patch all nodes in the flow
         self._patch_nodes()
@@ -102,10 +115,12 @@ def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
         if not hasattr(self, '_tracer'):
             # Fallback if not properly initialized
             return original_run(self, shared) if original_run else None
-        self._tracer.config.user_id = shared.get("user_id","default_user_id")
-        self._tracer.config.session_id = shared.get("session_id","default_session_id")
+        # Per-run identity; the shared config is never mutated
+        user_id = shared.get("user_id", self._tracer.config.user_id or "default_user_id")
+        session_id = shared.get("session_id", self._tracer.config.session_id or "default_session_id")
         # Start trace
-        self._trace_id = self._tracer.start_trace(self._flow_name, shared)
+        self._tracer.start_trace(self._flow_name, shared, session_id=session_id, user_id=user_id)
+        start = time.perf_counter()
         
         try:
             # Run the original flow
@@ -113,26 +128,27 @@ def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
             
             # End trace successfully
             self._tracer.end_trace(shared, "success")
+            _record_flow(self, start, "success")
             
             return result
             
         except Exception as e:
             # End trace with error
             self._tracer.end_trace(shared, "error")
+            _record_flow(self, start, "error")
             raise
-        finally:
-            # Ensure cleanup
-            self._tracer.flush()
     
     async def traced_run_async(self, shared):
         """Traced version of the async run method."""
         if not hasattr(self, '_tracer'):
             # Fallback if not properly initialized
             return await original_run_async(self, shared) if original_run_async else None
-        self._tracer.config.user_id = shared.get("user_id","default_user_id")
-        self._tracer.config.session_id = shared.get("session_id","default_session_id")
+        # Per-run identity; the shared config is never mutated
+        user_id = shared.get("user_id", self._tracer.config.user_id or "default_user_id")
+        session_id = shared.get("session_id", self._tracer.config.session_id or "default_session_id")
         # Start trace
-        self._trace_id = self._tracer.start_trace(self._flow_name, shared)
+        self._tracer.start_trace(self._flow_name, shared, session_id=session_id, user_id=user_id)
+        start = time.perf_counter()
         
         try:
             # Run the original flow
@@ -140,16 +156,15 @@ def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
             
             # End trace successfully
             self._tracer.end_trace(shared, "success")
+            _record_flow(self, start, "success")
             
             return result
             
         except Exception as e:
             # End trace with error
             self._tracer.end_trace(shared, "error")
+            _record_flow(self, start, "error")
             raise
-        finally:
-            # Ensure cleanup
-            self._tracer.flush()
     
     def patch_nodes(self):
         """Patch all nodes in the flow to add tracing."""
@@ -169,6 +184,12 @@ def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
             # Patch this node
             self._patch_node(node)
             
+            # Descend into sub-flows so their nodes nest under the sub-flow span
+            if isinstance(node, Flow) and node.start_node and id(node.start_node) not in visited:
+                nodes_to_patch.append(node.start_node)
+            if isinstance(node, Parallel):
+                nodes_to_patch.extend(member for member in node.nodes if id(member) not in visited)
+            
             # Add successors to patch list
             if hasattr(node, 'successors'):
                 for successor in node.successors.values():
@@ -179,115 +200,26 @@ def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
         """Patch a single node to add tracing."""
         if hasattr(node, '_pocketflow_traced'):
             return  # Already patched
-            
-        node_id = str(uuid.uuid4())
-        node_name = type(node).__name__
         
-        # Store original methods
-        original_prep = getattr(node, 'prep', None)
-        original_exec = getattr(node, 'exec', None)
-        original_post = getattr(node, 'post', None)
-        original_prep_async = getattr(node, 'prep_async', None)
-        original_exec_async = getattr(node, 'exec_async', None)
-        original_post_async = getattr(node, 'post_async', None)
+        # Per-instance tracing state; Flow._orch's copies of the node share it
+        node._pocketflow_node_id = str(uuid.uuid4())
+        node._pocketflow_tracer = self._tracer
+        node._pocketflow_flow_name = self._flow_name
         
-        # Create traced versions
-        if original_prep:
-            node.prep = self._create_traced_method(original_prep, node_id, node_name, 'prep')
-        if original_exec:
-            node.exec = self._create_traced_method(original_exec, node_id, node_name, 'exec')
-        if original_post:
-            node.post = self._create_traced_method(original_post, node_id, node_name, 'post')
-        if original_prep_async:
-            node.prep_async = self._create_traced_async_method(original_prep_async, node_id, node_name, 'prep')
-        if original_exec_async:
-            node.exec_async = self._create_traced_async_method(original_exec_async, node_id, node_name, 'exec')
-        if original_post_async:
-            node.post_async = self._create_traced_async_method(original_post_async, node_id, node_name, 'post')
-        
-        # Mark as traced
-        node._pocketflow_traced = True
-    
-    def create_traced_method(self, original_method, node_id, node_name, phase):
-        """Create a traced version of a synchronous method."""
-        @functools.wraps(original_method)
-        def traced_method(*args, **kwargs):
-            span_id = self._tracer.start_node_span(node_name, node_id, phase)
-            
-            try:
-                result = original_method(*args, **kwargs)
-                # Extract actual input
-                # Check if first arg is the node instance (bound method) or actual input (unbound)
-                actual_input = None
-                if len(args) > 0:
-                    # If first arg looks like a Node instance, take second arg
-                    first_arg = args[0]
-                    if hasattr(first_arg, '__class__') and 'Node' in first_arg.__class__.__name__:
-                        actual_input = args[1] if len(args) > 1 else None
-                    else:
-                        # First arg is the actual input
-                        actual_input = first_arg
-                
-                self._tracer.end_node_span(span_id, input_data=actual_input, output_data=result)
-                return result
-            except Exception as e:
-                # Extract actual input
-                actual_input = None
-                if len(args) > 0:
-                    first_arg = args[0]
-                    if hasattr(first_arg, '__class__') and 'Node' in first_arg.__class__.__name__:
-                        actual_input = args[1] if len(args) > 1 else None
-                    else:
-                        actual_input = first_arg
-                
-                self._tracer.end_node_span(span_id, input_data=actual_input, error=e)
-                raise
-                
-        return traced_method
-    
-    def create_traced_async_method(self, original_method, node_id, node_name, phase):
-        """Create a traced version of an asynchronous method."""
-        @functools.wraps(original_method)
-        async def traced_async_method(*args, **kwargs):
-            span_id = self._tracer.start_node_span(node_name, node_id, phase)
-            
-            try:
-                result = await original_method(*args, **kwargs)
-                # Extract actual input
-                # Check if first arg is the node instance (bound method) or actual input (unbound)
-                actual_input = None
-                if len(args) > 0:
-                    # If first arg looks like a Node instance, take second arg
-                    first_arg = args[0]
-                    if hasattr(first_arg, '__class__') and 'Node' in first_arg.__class__.__name__:
-                        actual_input = args[1] if len(args) > 1 else None
-                    else:
-                        # First arg is the actual input
-                        actual_input = first_arg
-                
-                self._tracer.end_node_span(span_id, input_data=actual_input, output_data=result)
-                return result
-            except Exception as e:
-                # Extract actual input
-                actual_input = None
-                if len(args) > 0:
-                    first_arg = args[0]
-                    if hasattr(first_arg, '__class__') and 'Node' in first_arg.__class__.__name__:
-                        actual_input = args[1] if len(args) > 1 else None
-                    else:
-                        actual_input = first_arg
-                
-                self._tracer.end_node_span(span_id, input_data=actual_input, error=e)
-                raise
-                
-        return traced_async_method
+        # Swap in a traced subclass, so phases run with the actual (copied) node as self
+        node.__class__ = _traced_node_class(type(node))
     
     # Replace methods on the class
     flow_class.__init__ = traced_init
     flow_class._patch_nodes = patch_nodes
     flow_class._patch_node = patch_node
-    flow_class._create_traced_method = create_traced_method
-    flow_class._create_traced_async_method = create_traced_async_method
+    
+    # Batch flows run _orch once per item: give each item its own span
+    if issubclass(flow_class, BatchFlow):
+        if issubclass(flow_class, AsyncFlow):
+            flow_class._orch_async = _traced_orch_async(flow_class._orch_async, "item")
+        else:
+            flow_class._orch = _traced_orch(flow_class._orch, "item")
     
     if original_run:
         flow_class.run = traced_run
@@ -297,12 +229,212 @@ def _trace_flow_class(flow_class, config, flow_name, session_id, user_id):
     return flow_class
 
 
-def _trace_flow_function(flow_func, config, flow_name, session_id, user_id):
+# Traced subclass per node class, built once and shared by every flow
+_TRACED_NODE_CLASSES: Dict[type, type] = {}
+
+
+def _traced_node_class(node_class):
+    """Return a subclass of node_class whose phases are traced and timed."""
+    traced_class = _TRACED_NODE_CLASSES.get(node_class)
+    if traced_class is not None:
+        return traced_class
+    
+    namespace = {
+        "_pocketflow_traced": True,
+        "__module__": node_class.__module__,
+        "__qualname__": node_class.__qualname__,
+    }
+    # Each run of the node is sampled once, before its first phase
+    namespace["_run"] = _sampled_run(node_class._run)
+    if hasattr(node_class, "_run_async"):
+        namespace["_run_async"] = _sampled_run_async(node_class._run_async)
+    # Parallel runs its members' phases directly: each member copy is sampled on its own
+    if issubclass(node_class, Parallel):
+        namespace["_members"] = _sampled_members(node_class._members)
+    for phase in ("prep", "exec", "post"):
+        if hasattr(node_class, phase):
+            namespace[phase] = _traced_method(getattr(node_class, phase), phase)
+        if hasattr(node_class, f"{phase}_async"):
+            namespace[f"{phase}_async"] = _traced_async_method(getattr(node_class, f"{phase}_async"), phase)
+    
+    # Sub-flows and parallel steps get a span around their whole orchestration
+    if issubclass(node_class, (AsyncFlow, AsyncParallel)):
+        namespace["_orch_async"] = _traced_orch_async(node_class._orch_async, "run")
+    elif issubclass(node_class, (Flow, Parallel)):
+        namespace["_orch"] = _traced_orch(node_class._orch, "run")
+    
+    traced_class = type(node_class.__name__, (node_class,), namespace)
+    _TRACED_NODE_CLASSES[node_class] = traced_class
+    return traced_class
+
+
+def _record_phase(node, phase, start, error=None, result=None):
+    """Record phase metrics; no-op unless metrics are enabled."""
+    tracer = node._pocketflow_tracer
+    if not tracer.config.metrics_enabled:
+        return
+    flow_name = node._pocketflow_flow_name
+    node_name = type(node).__name__
+    metrics.record_phase(
+        flow_name, node_name, phase, time.perf_counter() - start, error is not None, result
+    )
+    if phase == "exec" and getattr(node, "cur_retry", 0) > 0:
+        metrics.record_retry(flow_name, node_name)
+    # Exec is skipped on a cache hit, so the lookup result is recorded with post
+    if phase == "post" and getattr(node, "cache_hit", None) is not None:
+        metrics.record_cache(flow_name, node_name, node.cache_hit)
+
+
+def _record_flow(flow, start, status):
+    if flow._tracer.config.metrics_enabled:
+        metrics.record_flow(flow._flow_name, time.perf_counter() - start, status)
+
+
+def _sampled_run(original_run):
+    """Wrap a node's _run so its phases share one sampling decision."""
+    @functools.wraps(original_run)
+    def sampled_run(self, shared):
+        tracer = self._pocketflow_tracer
+        token = tracer.start_node_run(type(self).__name__)
+        try:
+            return original_run(self, shared)
+        finally:
+            tracer.end_node_run(token)
+    
+    return sampled_run
+
+
+def _sampled_run_async(original_run_async):
+    """Async version of _sampled_run."""
+    @functools.wraps(original_run_async)
+    async def sampled_run_async(self, shared):
+        tracer = self._pocketflow_tracer
+        token = tracer.start_node_run(type(self).__name__)
+        try:
+            return await original_run_async(self, shared)
+        finally:
+            tracer.end_node_run(token)
+    
+    return sampled_run_async
+
+
+def _sampled_members(original_members):
+    """Wrap Parallel._members so each member copy carries its own sampling decision."""
+    @functools.wraps(original_members)
+    def sampled_members(self, params):
+        nodes = original_members(self, params)
+        for node in nodes:
+            tracer = getattr(node, "_pocketflow_tracer", self._pocketflow_tracer)
+            node._pocketflow_sampled = tracer.sample_member(type(node).__name__)
+        return nodes
+    
+    return sampled_members
+
+
+def _traced_method(original_method, phase):
+    """Create a traced version of a synchronous phase method."""
+    @functools.wraps(original_method)
+    def traced_method(self, *args, **kwargs):
+        tracer = self._pocketflow_tracer
+        if not tracer.is_recording() and not tracer.config.metrics_enabled:
+            # Unsampled run: nothing to record
+            return original_method(self, *args, **kwargs)
+        span_id = tracer.start_node_span(
+            type(self).__name__, self._pocketflow_node_id, phase, getattr(self, "_pocketflow_sampled", None)
+        )
+        # First argument is the phase input (shared for prep/post, prep_res for exec)
+        actual_input = args[0] if args else None
+        start = time.perf_counter()
+        
+        try:
+            result = original_method(self, *args, **kwargs)
+        except Exception as e:
+            _record_phase(self, phase, start, error=e)
+            tracer.end_node_span(span_id, input_data=actual_input, error=e)
+            raise
+        
+        _record_phase(self, phase, start, result=result)
+        tracer.end_node_span(span_id, input_data=actual_input, output_data=result)
+        return result
+    
+    return traced_method
+
+
+def _traced_async_method(original_method, phase):
+    """Create a traced version of an asynchronous phase method."""
+    @functools.wraps(original_method)
+    async def traced_async_method(self, *args, **kwargs):
+        tracer = self._pocketflow_tracer
+        if not tracer.is_recording() and not tracer.config.metrics_enabled:
+            # Unsampled run: nothing to record
+            return await original_method(self, *args, **kwargs)
+        span_id = tracer.start_node_span(
+            type(self).__name__, self._pocketflow_node_id, phase, getattr(self, "_pocketflow_sampled", None)
+        )
+        # First argument is the phase input (shared for prep/post, prep_res for exec)
+        actual_input = args[0] if args else None
+        start = time.perf_counter()
+        
+        try:
+            result = await original_method(self, *args, **kwargs)
+        except Exception as e:
+            _record_phase(self, phase, start, error=e)
+            tracer.end_node_span(span_id, input_data=actual_input, error=e)
+            raise
+        
+        _record_phase(self, phase, start, result=result)
+        tracer.end_node_span(span_id, input_data=actual_input, output_data=result)
+        return result
+    
+    return traced_async_method
+
+
+def _traced_orch(original_orch, phase):
+    """Wrap a flow's orchestration so everything it runs nests under one span."""
+    @functools.wraps(original_orch)
+    def traced_orch(self, shared, params=None):
+        tracer = getattr(self, "_pocketflow_tracer", None) or self._tracer
+        if not tracer.is_recording():
+            return original_orch(self, shared, params)
+        node_id = getattr(self, "_pocketflow_node_id", None) or self._flow_name
+        span_id = tracer.start_node_span(type(self).__name__, node_id, phase)
+        try:
+            result = original_orch(self, shared, params)
+        except Exception as e:
+            tracer.end_node_span(span_id, input_data=params, error=e)
+            raise
+        tracer.end_node_span(span_id, input_data=params, output_data=result)
+        return result
+    
+    return traced_orch
+
+
+def _traced_orch_async(original_orch_async, phase):
+    """Async version of _traced_orch."""
+    @functools.wraps(original_orch_async)
+    async def traced_orch_async(self, shared, params=None):
+        tracer = getattr(self, "_pocketflow_tracer", None) or self._tracer
+        if not tracer.is_recording():
+            return await original_orch_async(self, shared, params)
+        node_id = getattr(self, "_pocketflow_node_id", None) or self._flow_name
+        span_id = tracer.start_node_span(type(self).__name__, node_id, phase)
+        try:
+            result = await original_orch_async(self, shared, params)
+        except Exception as e:
+            tracer.end_node_span(span_id, input_data=params, error=e)
+            raise
+        tracer.end_node_span(span_id, input_data=params, output_data=result)
+        return result
+    
+    return traced_orch_async
+
+
+def _trace_flow_function(flow_func, config, flow_name, session_id, user_id, tracer=None):
     """Trace a flow function (for functional-style flows)."""
     
     # Get or create config
     if config is None:
-        config = TracingConfig.from_env()
+        config = tracer.config if tracer else TracingConfig.from_env()
     
     # Override session/user if provided
     if session_id:
@@ -314,7 +446,8 @@ def _trace_flow_function(flow_func, config, flow_name, session_id, user_id):
     if flow_name is None:
         flow_name = flow_func.__name__
     
-    tracer = LangfuseTracer(config)
+    if tracer is None:
+        tracer = LangfuseTracer(config)
     
     @functools.wraps(flow_func)
     def traced_flow_func(*args, **kwargs):
@@ -331,7 +464,5 @@ def _trace_flow_function(flow_func, config, flow_name, session_id, user_id):
         except Exception as e:
             tracer.end_trace(shared, "error")
             raise
-        finally:
-            tracer.flush()
     
     return traced_flow_func
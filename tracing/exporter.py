@@ -0,0 +1,166 @@
+"""
+Background exporter for PocketFlow tracing.
+
+Tracing backend calls are queued and executed on a daemon thread, so a flow run
+only pays for an in-memory enqueue instead of a network round-trip.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class _FlushMarker:
+    """Queue item that signals when everything queued before it has been exported."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class BackgroundExporter:
+    """
+    Executes queued export calls in order on a single background thread.
+
+    Calls are drained in batches of up to batch_size; after each batch (at most
+    every flush_interval seconds) the optional on_flush callback pushes them to
+    the backend. When the queue is full, new calls are dropped and counted
+    rather than blocking the caller.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        on_flush: Optional[Callable[[], Any]] = None,
+        debug: bool = False,
+    ):
+        """
+        Initialize the BackgroundExporter and start its worker thread.
+
+        Args:
+            max_queue_size: Maximum number of pending calls before dropping.
+            batch_size: Maximum number of calls executed per worker wake-up.
+            flush_interval: Seconds between on_flush calls while there is traffic.
+            on_flush: Optional callback that flushes the backend client.
+            debug: Print export errors and drops.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.debug = debug
+        self.dropped = 0
+        self.exported = 0
+        self.errors = 0
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue_size)
+        self._last_flush = time.monotonic()
+        self._pending_flush = False
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._worker, name="pocketflow-trace-exporter", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> bool:
+        """
+        Queue a call for background execution without blocking.
+
+        Returns:
+            True if queued, False if dropped because the queue is full or closed.
+        """
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait((fn, args, kwargs))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.debug and self.dropped % 1000 == 1:
+                print(f"✗ Trace export queue full, dropped {self.dropped} calls so far")
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every call queued so far has been exported.
+
+        Args:
+            timeout: Maximum seconds to wait. None waits indefinitely.
+
+        Returns:
+            True if the queue drained in time, False otherwise.
+        """
+        if not self._thread.is_alive():
+            return False
+        marker = _FlushMarker()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Flush pending calls and stop the worker thread."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _worker(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._maybe_flush(force=True)
+                continue
+
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for item in batch:
+                if item is _STOP:
+                    self._maybe_flush(force=True)
+                    return
+                if isinstance(item, _FlushMarker):
+                    self._maybe_flush(force=True)
+                    item.done.set()
+                    continue
+                fn, args, kwargs = item
+                try:
+                    fn(*args, **kwargs)
+                    self.exported += 1
+                except Exception as e:
+                    self.errors += 1
+                    if self.debug:
+                        print(f"✗ Trace export call failed: {e}")
+                self._pending_flush = True
+
+            self._maybe_flush()
+
+    def _maybe_flush(self, force: bool = False) -> None:
+        if not self._pending_flush or not self.on_flush:
+            return
+        if not force and time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        try:
+            self.on_flush()
+        except Exception as e:
+            if self.debug:
+                print(f"✗ Failed to flush traces: {e}")
+        self._pending_flush = False
+        self._last_flush = time.monotonic()
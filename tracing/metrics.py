@@ -0,0 +1,201 @@
+"""
+In-process metrics for PocketFlow node phases.
+
+Works without any tracing backend: the trace_flow decorator records phase
+durations, errors, retries and payload sizes here, and the registry can be
+exported as Prometheus text or JSON.
+"""
+
+import bisect
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Characters for text/bytes, items for collections
+SIZE_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters and histograms keyed by name and labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    @staticmethod
+    def _key(labels: Optional[Dict[str, Any]]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+    def inc(self, name: str, labels: Optional[Dict[str, Any]] = None, amount: float = 1, help: str = "") -> None:
+        """Increase a counter."""
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Optional[Dict[str, Any]] = None,
+        buckets: Tuple[float, ...] = DURATION_BUCKETS,
+        help: str = "",
+    ) -> None:
+        """Record one observation in a histogram."""
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # --- PocketFlow helpers ---
+
+    def record_phase(
+        self, flow: str, node: str, phase: str, duration: float, error: bool = False, payload: Any = None
+    ) -> None:
+        """Record one node phase (prep, exec or post)."""
+        labels = {"flow": flow, "node": node, "phase": phase}
+        self.observe(
+            "pocketflow_node_phase_duration_seconds", duration, labels,
+            help="Duration of node phases",
+        )
+        if error:
+            self.inc("pocketflow_node_phase_errors_total", labels, help="Node phases that raised")
+        elif payload is not None:
+            size = payload_size(payload)
+            if size is not None:
+                self.observe(
+                    "pocketflow_node_payload_size", size, labels, SIZE_BUCKETS,
+                    help="Phase output size (characters for text, items for collections)",
+                )
+
+    def record_retry(self, flow: str, node: str) -> None:
+        """Count one exec retry (an attempt with Node.cur_retry > 0)."""
+        self.inc("pocketflow_node_retries_total", {"flow": flow, "node": node}, help="Node exec retries")
+
+    def record_cache(self, flow: str, node: str, hit: bool) -> None:
+        """Count one lookup in a node's exec-result cache."""
+        self.inc(
+            "pocketflow_node_cache_lookups_total",
+            {"flow": flow, "node": node, "result": "hit" if hit else "miss"},
+            help="Node exec cache lookups",
+        )
+
+    def record_flow(self, flow: str, duration: float, status: str) -> None:
+        """Record one complete flow run."""
+        self.observe(
+            "pocketflow_flow_duration_seconds", duration, {"flow": flow, "status": status},
+            help="Duration of flow runs",
+        )
+
+    # --- Export ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of all metrics as plain data."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": h.count,
+                        "sum": h.sum,
+                        "buckets": {("+Inf" if b == float("inf") else b): c for b, c in h.cumulative()},
+                    }
+                    for key, h in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    for bound, count in h.cumulative():
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for k, v in key
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def payload_size(data: Any) -> Optional[int]:
+    """Cheap size estimate: length of text/bytes or number of items in a collection."""
+    if isinstance(data, (str, bytes, list, tuple, dict, set)):
+        return len(data)
+    return None
+
+
+# Process-wide registry used by trace_flow
+metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return metrics
@@ -0,0 +1,72 @@
+"""
+Trace sampling decisions for PocketFlow tracing.
+"""
+
+import random
+import time
+from typing import Optional
+
+from .config import TracingConfig
+
+# Run modes
+RECORD = "record"  # Export calls as they happen
+BUFFER = "buffer"  # Hold calls until the run ends, then keep or discard them
+ERRORS = "errors"  # Record no spans; export a bare trace only if the run fails
+DROP = "drop"  # Record nothing
+
+
+class RunSampling:
+    """Sampling state of one root flow run."""
+
+    __slots__ = ("mode", "buffer", "start", "trace_info")
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.buffer = [] if mode == BUFFER else None
+        self.start = time.perf_counter()
+        self.trace_info = None  # Trace name/session/user, kept for ERRORS runs
+
+    @property
+    def recording(self) -> bool:
+        """Whether spans are created for this run."""
+        return self.mode in (RECORD, BUFFER)
+
+    @property
+    def duration_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+
+def _sampled(rate: float) -> bool:
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def start_run(config: TracingConfig, flow_name: str) -> RunSampling:
+    """
+    Make the head-based decision for a new root run.
+
+    Head-sampled runs are recorded directly, or buffered until their duration
+    is known when a latency threshold is set. Other runs record no spans; with
+    always_sample_errors they still export a bare trace if they fail.
+    """
+    rate = config.flow_sample_rates.get(flow_name, config.sample_rate)
+    if _sampled(rate):
+        return RunSampling(RECORD if config.latency_threshold_ms is None else BUFFER)
+    return RunSampling(ERRORS if config.always_sample_errors else DROP)
+
+
+def keep_run(config: TracingConfig, run: RunSampling, status: str) -> bool:
+    """Tail decision for a buffered run, once its status and duration are known."""
+    if status == "error" and config.always_sample_errors:
+        return True
+    return run.duration_ms >= config.latency_threshold_ms
+
+
+def sample_node(config: TracingConfig, node_name: str) -> bool:
+    """Whether to record spans for one run of a node (all of its phases)."""
+    rate: Optional[float] = config.node_sample_rates.get(node_name)
+    return rate is None or _sampled(rate)
+
+
+def trace_phase(config: TracingConfig, phase: str) -> bool:
+    """Whether spans are enabled for this node phase."""
+    return getattr(config, f"trace_{phase}", True)
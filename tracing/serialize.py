@@ -0,0 +1,124 @@
+"""
+Size-capped serialization of traced inputs and outputs.
+"""
+
+import reprlib
+from typing import Any, Iterable, Optional
+
+
+class TraceSerializer:
+    """
+    Converts arbitrary phase data into small JSON-friendly structures.
+
+    Strings are truncated, large collections are sampled, nesting is cut at
+    max_depth, and dict fields can be filtered by allow/deny lists. Work is
+    bounded by these limits, not by the size of the input.
+    """
+
+    def __init__(
+        self,
+        max_string_length: int = 2000,
+        max_items: int = 20,
+        max_depth: int = 4,
+        allow_fields: Optional[Iterable[str]] = None,
+        deny_fields: Optional[Iterable[str]] = None,
+    ):
+        """
+        Initialize the TraceSerializer.
+
+        Args:
+            max_string_length: Characters kept per string.
+            max_items: Items kept per list/tuple/set/dict; larger ones are sampled.
+            max_depth: Nesting depth below which values are only summarized.
+            allow_fields: If set, only these top-level dict keys are kept.
+            deny_fields: Dict keys dropped at any depth.
+        """
+        self.max_string_length = max_string_length
+        self.max_items = max_items
+        self.max_depth = max_depth
+        self.allow_fields = set(allow_fields) if allow_fields else None
+        self.deny_fields = set(deny_fields or ())
+
+        self._repr = reprlib.Repr()
+        self._repr.maxstring = max_string_length
+        self._repr.maxother = max_string_length
+        self._repr.maxlist = self._repr.maxtuple = self._repr.maxdict = max_items
+
+    def serialize(self, data: Any) -> Any:
+        """Serialize data within the configured limits."""
+        return self._serialize(data, 0)
+
+    def _serialize(self, data: Any, depth: int) -> Any:
+        if data is None or isinstance(data, (bool, int, float)):
+            return data
+        if isinstance(data, str):
+            return self._truncate(data)
+        if isinstance(data, (bytes, bytearray)):
+            return {"_type": type(data).__name__, "_len": len(data)}
+
+        if depth >= self.max_depth:
+            return self._summary(data)
+
+        if isinstance(data, dict):
+            return self._serialize_dict(data, depth, top_level=depth == 0)
+        if isinstance(data, (list, tuple, set, frozenset)):
+            return self._serialize_sequence(data, depth)
+
+        # numpy arrays and similar: shape/dtype only, never the values
+        if hasattr(data, "shape") and hasattr(data, "dtype"):
+            return {"_type": type(data).__name__, "shape": list(data.shape), "dtype": str(data.dtype)}
+
+        # Objects (e.g. Qdrant ScoredPoint): their public attributes
+        attributes = getattr(data, "__dict__", None)
+        if isinstance(attributes, dict):
+            fields = self._serialize_dict(
+                {k: v for k, v in attributes.items() if not k.startswith("_")}, depth, top_level=False
+            )
+            fields["_type"] = type(data).__name__
+            return fields
+
+        return {"_type": type(data).__name__, "_data": self._repr.repr(data)}
+
+    def _serialize_dict(self, data: dict, depth: int, top_level: bool) -> dict:
+        result = {}
+        kept = 0
+        for key, value in data.items():
+            if key in self.deny_fields:
+                continue
+            if top_level and self.allow_fields is not None and key not in self.allow_fields:
+                continue
+            if kept >= self.max_items:
+                result["_truncated_keys"] = len(data) - kept
+                break
+            result[str(key)] = self._serialize(value, depth + 1)
+            kept += 1
+        return result
+
+    def _serialize_sequence(self, data, depth: int) -> Any:
+        items = data if isinstance(data, (list, tuple)) else list(data)
+        if len(items) <= self.max_items:
+            return [self._serialize(item, depth + 1) for item in items]
+
+        # Evenly spaced sample, always including the first and last item
+        step = (len(items) - 1) / (self.max_items - 1) if self.max_items > 1 else len(items)
+        indices = sorted({round(i * step) for i in range(self.max_items)})
+        return {
+            "_type": type(data).__name__,
+            "_len": len(items),
+            "_sample_indices": indices,
+            "_sample": [self._serialize(items[i], depth + 1) for i in indices],
+        }
+
+    def _truncate(self, text: str) -> str:
+        if len(text) <= self.max_string_length:
+            return text
+        return text[: self.max_string_length] + f"...[+{len(text) - self.max_string_length} chars]"
+
+    def _summary(self, data: Any) -> dict:
+        summary = {"_type": type(data).__name__}
+        if hasattr(data, "__len__"):
+            try:
+                summary["_len"] = len(data)
+            except TypeError:
+                pass
+        return summary
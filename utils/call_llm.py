@@ -1,26 +1,51 @@
 import os
+from typing import Iterator
 import google.generativeai as genai
 from google.api_core import retry
 
+MODEL_NAME = 'gemini-2.5-flash-lite'
+# Input token limit of MODEL_NAME
+MODEL_INPUT_TOKEN_LIMIT = 1_048_576
+
 def call_llm(prompt: str) -> str:
     """
     Calls Google Gemini API.
     Reads GEMINI_API_KEY from environment variables.
+    Raises RuntimeError if the key is missing or the call fails.
     """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
-        return "Error: GEMINI_API_KEY not found in environment variables."
+        raise RuntimeError("GEMINI_API_KEY not found in environment variables.")
 
     genai.configure(api_key=api_key)
 
     # Use a standard model
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
+    model = genai.GenerativeModel(MODEL_NAME)
 
     try:
         response = model.generate_content(prompt)
         return response.text
     except Exception as e:
-        return f"Error calling Gemini: {str(e)}"
+        raise RuntimeError(f"Error calling Gemini: {str(e)}") from e
+
+def stream_llm(prompt: str) -> Iterator[str]:
+    """
+    Like call_llm, but yields the answer text piece by piece as Gemini generates it.
+    Raises RuntimeError if the key is missing or the call fails, also mid-stream.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY not found in environment variables.")
+
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(MODEL_NAME)
+
+    try:
+        for chunk in model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        raise RuntimeError(f"Error calling Gemini: {str(e)}") from e
 
 if __name__ == "__main__":
     # Test call
@@ -0,0 +1,135 @@
+import os
+import glob
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from tokenizers import Tokenizer
+
+from utils.embedding_models import DENSE_MODEL_NAME, MODEL_CACHE_DIR, OFFLINE, get_model, get_registry
+
+logger = logging.getLogger(__name__)
+
+# MiniLM only embeds the first 128 word-pieces of its input (special tokens included).
+DEFAULT_MAX_TOKENS = 128
+CHUNK_OVERLAP_TOKENS = 24
+DEFAULT_CHUNK_WORKERS = 4
+
+def _cached_tokenizer_file() -> Optional[str]:
+    """tokenizer.json of the dense model in the fastembed cache, if it was downloaded."""
+    model_dir = DENSE_MODEL_NAME.split("/")[-1]
+    pattern = os.path.join(MODEL_CACHE_DIR, f"*{model_dir}*", "**", "tokenizer.json")
+    paths = sorted(glob.glob(pattern, recursive=True))
+    return paths[0] if paths else None
+
+def _model_max_length(tokenizer_file: str) -> int:
+    """model_max_length from the tokenizer_config.json next to tokenizer_file."""
+    try:
+        with open(os.path.join(os.path.dirname(tokenizer_file), "tokenizer_config.json"), encoding="utf-8") as f:
+            max_length = json.load(f).get("model_max_length")
+    except (OSError, ValueError):
+        return DEFAULT_MAX_TOKENS
+    # Transformers writes a huge sentinel when the model sets no limit
+    return int(max_length) if isinstance(max_length, (int, float)) and max_length < 100_000 else DEFAULT_MAX_TOKENS
+
+@lru_cache(maxsize=1)
+def get_chunk_tokenizer() -> Tuple[Tokenizer, int]:
+    """
+    Returns (tokenizer, max_tokens) for the dense embedding model.
+    The tokenizer is an untruncated copy so we can measure full text length
+    without touching the instance used for embedding.
+
+    Only the tokenizer is loaded, from the model cache or the hub; the ONNX
+    model is not, unless it is already loaded in this process or neither has
+    the tokenizer. Processes embedding through EMBEDDING_SERVER stay model-free.
+    """
+    tokenizer_file = None if get_registry().is_loaded("dense") else _cached_tokenizer_file()
+    if tokenizer_file is not None:
+        tokenizer = Tokenizer.from_file(tokenizer_file)
+        max_tokens = (tokenizer.truncation or {}).get("max_length") or _model_max_length(tokenizer_file)
+    elif not get_registry().is_loaded("dense") and not OFFLINE:
+        tokenizer = Tokenizer.from_pretrained(DENSE_MODEL_NAME)
+        max_tokens = (tokenizer.truncation or {}).get("max_length", DEFAULT_MAX_TOKENS)
+    else:
+        source = getattr(getattr(get_model("dense"), "model", None), "tokenizer", None)
+        if source is None:
+            raise RuntimeError(f"Dense model tokenizer not exposed by fastembed and not in {MODEL_CACHE_DIR}")
+        max_tokens = (source.truncation or {}).get("max_length", DEFAULT_MAX_TOKENS)
+        tokenizer = Tokenizer.from_str(source.to_str())
+
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer, max_tokens
+
+def count_tokens(text: str) -> int:
+    """Number of word-pieces in text, excluding special tokens."""
+    tokenizer, _ = get_chunk_tokenizer()
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+def get_chunk_token_limit() -> int:
+    """Largest chunk (in word-pieces) the dense model embeds without truncation."""
+    tokenizer, max_tokens = get_chunk_tokenizer()
+    special_tokens = len(tokenizer.encode("", add_special_tokens=True).ids)
+    return max_tokens - special_tokens
+
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_tokens: Optional[int] = None, chunk_overlap: int = CHUNK_OVERLAP_TOKENS) -> RecursiveCharacterTextSplitter:
+    """
+    Builds (once per size) a splitter that measures length in embedding tokens.
+    """
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_tokens or get_chunk_token_limit(),
+        chunk_overlap=chunk_overlap,
+        length_function=count_tokens,
+    )
+
+def _chunk_document(doc: Dict[str, Any], splitter: RecursiveCharacterTextSplitter) -> List[Dict[str, Any]]:
+    chunks = splitter.split_text(doc['content'])
+    return [
+        {
+            "text": chunk,
+            "metadata": {
+                "source": doc['name'],
+                "file_id": doc['id'],
+                "chunk_index": i
+            }
+        }
+        for i, chunk in enumerate(chunks)
+    ]
+
+def chunk_documents(documents: List[Dict[str, Any]], max_workers: int = DEFAULT_CHUNK_WORKERS) -> List[Dict[str, Any]]:
+    """
+    Splits documents into token-sized chunks, one document per worker.
+    Output order follows the input order.
+    """
+    if not documents:
+        return []
+
+    splitter = get_text_splitter()
+
+    if max_workers <= 1 or len(documents) == 1:
+        per_doc = [_chunk_document(doc, splitter) for doc in documents]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(documents))) as pool:
+            per_doc = list(pool.map(lambda doc: _chunk_document(doc, splitter), documents))
+
+    return [chunk for chunks in per_doc for chunk in chunks]
+
+def truncation_stats(texts: List[str]) -> Dict[str, int]:
+    """
+    Measures how much of each text the dense model would drop at its token limit.
+    """
+    tokenizer, _ = get_chunk_tokenizer()
+    limit = get_chunk_token_limit()
+
+    lengths = [len(e.ids) for e in tokenizer.encode_batch(texts, add_special_tokens=False)]
+    truncated = [max(0, n - limit) for n in lengths]
+    return {
+        "chunks": len(texts),
+        "tokens": sum(lengths),
+        "truncated_tokens": sum(truncated),
+        "truncated_chunks": sum(1 for t in truncated if t > 0),
+    }
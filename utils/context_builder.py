@@ -0,0 +1,142 @@
+import os
+import re
+import logging
+from typing import List, Dict, Any, Tuple
+
+from utils.call_llm import MODEL_INPUT_TOKEN_LIMIT
+from utils.chunking import count_tokens, get_chunk_tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Tokens of retrieved context per answer (the default is about the old
+# 20000-character slice); capped by MODEL_INPUT_TOKEN_LIMIT
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "5000"))
+# Room for the prompt template, the question and the answer
+RESERVED_TOKENS = 2048
+# Smallest trimmed piece worth sending
+MIN_SEGMENT_TOKENS = 32
+# Shorter suffix/prefix matches between neighbours are coincidence, not chunk_overlap
+MIN_OVERLAP_CHARS = 16
+
+_SENTENCE_END = re.compile(r"[.!?。！？…](?:\s|$)|\n")
+
+def context_token_budget(query: str = "") -> int:
+    """CONTEXT_TOKEN_BUDGET, or less if the model's input limit leaves less room."""
+    available = MODEL_INPUT_TOKEN_LIMIT - RESERVED_TOKENS - count_tokens(query)
+    return max(0, min(CONTEXT_TOKEN_BUDGET, available))
+
+def _token_prefix(text: str, max_tokens: int) -> str:
+    """The longest prefix of text with at most max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_chunk_tokenizer()[0].encode(text, add_special_tokens=False)
+    if len(encoding.ids) <= max_tokens:
+        return text
+    return text[:encoding.offsets[max_tokens - 1][1]]
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is a prefix of right."""
+    for k in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:k]):
+            return k
+    return 0
+
+def _join(left: str, right: str) -> str:
+    k = _overlap(left, right)
+    if k:
+        return left + right[k:]
+    return left + "\n" + right
+
+def merge_adjacent_chunks(points) -> List[Dict[str, Any]]:
+    """
+    Groups retrieved chunks by file, joins consecutive chunk indices and drops
+    the text they share (chunk_overlap). Each segment keeps its best score.
+    """
+    by_file: Dict[str, list] = {}
+    for p in points:
+        payload = p.payload or {}
+        by_file.setdefault(payload.get("file_id", str(p.id)), []).append(p)
+
+    segments = []
+    for file_id, file_points in by_file.items():
+        file_points.sort(key=lambda p: p.payload.get("chunk_index", 0))
+        current = None
+        for p in file_points:
+            idx = p.payload.get("chunk_index", 0)
+            text = p.payload.get("text", "")
+            if current and idx == current["last_index"] + 1:
+                current["text"] = _join(current["text"], text)
+                current["last_index"] = idx
+                current["score"] = max(current["score"], p.score or 0.0)
+            elif current and idx == current["last_index"]:
+                continue
+            else:
+                current = {
+                    "file_id": file_id,
+                    "source": p.payload.get("source", file_id),
+                    "also_in": p.payload.get("sources", [])[1:],
+                    "first_index": idx,
+                    "last_index": idx,
+                    "text": text,
+                    "score": p.score or 0.0,
+                }
+                segments.append(current)
+
+    segments.sort(key=lambda s: s["score"], reverse=True)
+    return segments
+
+def _trim_to_sentence(text: str, max_tokens: int) -> str:
+    """Cuts text to at most max_tokens, ending on a sentence boundary when possible."""
+    head = _token_prefix(text, max_tokens)
+    if head == text:
+        return text
+    ends = [m.end() for m in _SENTENCE_END.finditer(head)]
+    return head[:ends[-1]].rstrip() if ends else ""
+
+def _header(source: str, also_in: List[str]) -> str:
+    also = f"; also in {', '.join(also_in)}" if also_in else ""
+    return f"[Source: {source}{also}]\n"
+
+def build_context(points, token_budget: int) -> Tuple[str, Dict[str, int]]:
+    """
+    Packs retrieved chunks into at most token_budget tokens, best segments first.
+
+    Returns (context_text, stats) where stats compares against the previous
+    behaviour of joining every chunk, each with its source header, and cutting
+    the result to the same budget.
+    """
+    if not points:
+        return "", {"baseline_tokens": 0, "context_tokens": 0, "tokens_saved": 0, "segments": 0}
+
+    baseline = _token_prefix(
+        "\n\n".join(_header(p.payload.get("source", str(p.id)), []) + p.payload.get("text", "") for p in points),
+        token_budget,
+    )
+
+    parts = []
+    used = 0
+    for segment in merge_adjacent_chunks(points):
+        header = _header(segment["source"], segment.get("also_in"))
+        remaining = token_budget - used - count_tokens(header)
+        if remaining < MIN_SEGMENT_TOKENS:
+            continue
+
+        text = _trim_to_sentence(segment["text"], remaining)
+        if text != segment["text"] and count_tokens(text) < MIN_SEGMENT_TOKENS:
+            continue
+
+        block = header + text
+        parts.append(block)
+        used += count_tokens(block)
+
+    context_text = "\n\n".join(parts)
+    baseline_tokens = count_tokens(baseline)
+    context_tokens = count_tokens(context_text)
+    stats = {
+        "baseline_tokens": baseline_tokens,
+        "context_tokens": context_tokens,
+        # Both are cut to the same budget; tokenizing a join can differ from its parts by a token or two
+        "tokens_saved": max(0, baseline_tokens - context_tokens),
+        "segments": len(parts),
+    }
+    return context_text, stats
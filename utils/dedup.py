@@ -0,0 +1,115 @@
+import os
+import re
+import zlib
+import hashlib
+import logging
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Estimated Jaccard similarity of word shingles above which two chunks count as duplicates
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+# LSH: 16 bands of 8 rows makes pairs above ~0.7 similarity candidates,
+# which are then checked against DEDUP_THRESHOLD
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+def normalize(text: str) -> str:
+    """Lowercase words only, so whitespace, punctuation and case changes don't matter."""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+def shingles(text: str) -> np.ndarray:
+    """32-bit hashes of the distinct word n-grams of normalized text."""
+    words = text.split()
+    if len(words) <= SHINGLE_WORDS:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM values) of normalized text."""
+    hashes = shingles(text)
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+def _merge_sources(kept: Dict[str, Any], duplicate: Dict[str, Any]) -> None:
+    meta, dup = kept["metadata"], duplicate["metadata"]
+    for file_id, source in zip(dup["file_ids"], dup["sources"]):
+        if file_id not in meta["file_ids"]:
+            meta["file_ids"].append(file_id)
+            meta["sources"].append(source)
+
+def dedup_chunks(chunks: List[Dict[str, Any]], threshold: float = DEDUP_THRESHOLD) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Collapses exact and near-duplicate chunks, keeping the first occurrence.
+
+    Every kept chunk's metadata gets "file_ids" and "sources": the files its
+    text appears in, its own first. Exact duplicates are matched on the
+    normalized text; near duplicates through MinHash LSH on word shingles.
+
+    Returns (kept_chunks, stats).
+    """
+    kept: List[Dict[str, Any]] = []
+    by_text: Dict[str, int] = {}
+    signatures: List[np.ndarray] = []
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    exact = near = 0
+
+    for chunk in chunks:
+        meta = dict(chunk["metadata"])
+        meta["file_ids"] = list(meta.get("file_ids") or [meta["file_id"]])
+        meta["sources"] = list(meta.get("sources") or [meta["source"]])
+        chunk = {**chunk, "metadata": meta}
+
+        text = normalize(chunk["text"])
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if key in by_text:
+            _merge_sources(kept[by_text[key]], chunk)
+            exact += 1
+            continue
+
+        signature = minhash(text)
+        bands = [(b, signature[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS)]
+        candidates = {i for band in bands for i in buckets.get(band, ())}
+        match = next((i for i in sorted(candidates) if similarity(signature, signatures[i]) >= threshold), None)
+        if match is not None:
+            _merge_sources(kept[match], chunk)
+            near += 1
+            continue
+
+        index = len(kept)
+        kept.append(chunk)
+        by_text[key] = index
+        signatures.append(signature)
+        for band in bands:
+            buckets.setdefault(band, []).append(index)
+
+    removed = exact + near
+    stats = {
+        "chunks_in": len(chunks),
+        "chunks_out": len(kept),
+        "exact_duplicates": exact,
+        "near_duplicates": near,
+        "removed_pct": round(100.0 * removed / len(chunks), 1) if chunks else 0.0,
+    }
+    logger.info(
+        f"Dedup: {len(chunks)} -> {len(kept)} chunks "
+        f"({exact} exact, {near} near duplicates, {stats['removed_pct']}% removed)"
+    )
+    return kept, stats
@@ -1,24 +1,79 @@
 import os
 import io
 import logging
+import threading
 from typing import Optional, List, Dict, Any
+import httplib2
+import google_auth_httplib2
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
+from googleapiclient.http import MediaIoBaseDownload, HttpRequest
 from google.oauth2 import service_account
 from googleapiclient.errors import HttpError
 import pdfplumber
 import docx2txt
-import streamlit as st
+from utils.rate_limit import AdaptiveRateLimiter
 
 # Constants
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly', 'https://www.googleapis.com/auth/drive.metadata.readonly']
 # We prioritize env var, but fallback to a default file name
 DEFAULT_SERVICE_ACCOUNT_FILE = "service_account.json"
 
+# Minimal field masks: only what callers read
+FILE_FIELDS = "id, name, mimeType"
+LIST_FIELDS = f"nextPageToken, files({FILE_FIELDS})"
+# Drive API limits
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 100
+
+# Drive calls per second shared by all threads of the process (adapts down on quota errors)
+DRIVE_QPS = float(os.getenv("DRIVE_QPS", "10"))
+DRIVE_BURST = float(os.getenv("DRIVE_BURST", "20"))
+DRIVE_MAX_RETRIES = int(os.getenv("DRIVE_MAX_RETRIES", "6"))
+
+QUOTA_REASONS = {"userRateLimitExceeded", "rateLimitExceeded", "dailyLimitExceeded", "quotaExceeded"}
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class DriveReadError(Exception):
+    """A file could not be downloaded or extracted. retryable: worth trying again later."""
+    def __init__(self, file_id: str, message: str, retryable: bool = False):
+        super().__init__(f"{file_id}: {message}")
+        self.file_id = file_id
+        self.retryable = retryable
+
+def _http_status(e: Exception) -> Optional[int]:
+    return e.resp.status if isinstance(e, HttpError) else None
+
+def is_quota_error(e: Exception) -> bool:
+    status = _http_status(e)
+    if status == 429:
+        return True
+    if status == 403:
+        reasons = {d.get("reason") for d in (e.error_details or []) if isinstance(d, dict)}
+        return bool(reasons & QUOTA_REASONS) or any(r in str(e) for r in QUOTA_REASONS)
+    return False
+
+def is_transient_error(e: Exception) -> bool:
+    status = _http_status(e)
+    if status is not None:
+        return status >= 500
+    return isinstance(e, (TimeoutError, ConnectionError, httplib2.HttpLib2Error))
+
+# Every Drive request goes through this limiter
+drive_limiter = AdaptiveRateLimiter(
+    max_rate=DRIVE_QPS,
+    burst=DRIVE_BURST,
+    max_retries=DRIVE_MAX_RETRIES,
+    is_quota_error=is_quota_error,
+    is_transient_error=is_transient_error,
+)
+
+def execute(request, cost: float = 1):
+    """request.execute() under the shared rate limit, with backoff on quota and transient errors."""
+    return drive_limiter.call(request.execute, cost=cost)
+
 def get_credentials() -> Optional[service_account.Credentials]:
     """
     Get valid Service Account credentials from storage or environment.
@@ -57,20 +112,93 @@ def get_service_account_email() -> str:
 
 # Global variable to cache the service instance
 _DRIVE_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+# httplib2.Http is not thread-safe: each thread gets its own authorized
+# connection, kept alive and reused for all of that thread's requests.
+_THREAD_HTTP = threading.local()
+
+def _thread_http(credentials) -> google_auth_httplib2.AuthorizedHttp:
+    http = getattr(_THREAD_HTTP, "http", None)
+    if http is None:
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=60))
+        _THREAD_HTTP.http = http
+    return http
 
 def get_drive_service():
-    """Authentication to Google Drive"""
+    """
+    Authentication to Google Drive.
+    The service object is shared; every request it builds runs on the calling
+    thread's own connection, so it can be used from concurrent threads.
+    """
     global _DRIVE_SERVICE
-    if _DRIVE_SERVICE:
+    with _SERVICE_LOCK:
+        if _DRIVE_SERVICE:
+            return _DRIVE_SERVICE
+
+        creds = get_credentials()
+        if not creds:
+            logger.error("Could not obtain valid credentials.")
+            return None
+
+        def build_request(http, *args, **kwargs):
+            return HttpRequest(_thread_http(creds), *args, **kwargs)
+
+        _DRIVE_SERVICE = build(
+            'drive', 'v3', http=_thread_http(creds), requestBuilder=build_request, cache_discovery=False
+        )
         return _DRIVE_SERVICE
 
-    creds = get_credentials()
-    if not creds:
-        logger.error("Could not obtain valid credentials.")
-        return None
+def list_folder_files(folder_id: str) -> List[Dict[str, Any]]:
+    """All non-trashed files directly inside a folder, following every result page."""
+    service = get_drive_service()
+    if not service:
+        return []
 
-    _DRIVE_SERVICE = build('drive', 'v3', credentials=creds)
-    return _DRIVE_SERVICE
+    query = f"'{folder_id}' in parents and trashed = false"
+    files, page_token = [], None
+    while True:
+        results = execute(service.files().list(
+            q=query, pageSize=MAX_PAGE_SIZE, fields=LIST_FIELDS, pageToken=page_token
+        ))
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files
+
+def get_file_metadata(file_id: str) -> Dict[str, Any]:
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Could not connect to Drive.")
+    return execute(service.files().get(fileId=file_id, fields=FILE_FIELDS))
+
+def batch_get_metadata(file_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Metadata for many files, up to MAX_BATCH_SIZE per HTTP round trip.
+
+    Returns:
+        {file_id: metadata}; files that could not be read are left out.
+    """
+    service = get_drive_service()
+    if not service or not file_ids:
+        return {}
+
+    metadata = {}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            logger.warning(f"Metadata lookup failed for {request_id}: {exception}")
+        else:
+            metadata[request_id] = response
+
+    ids = list(dict.fromkeys(file_ids))
+    for start in range(0, len(ids), MAX_BATCH_SIZE):
+        chunk = ids[start:start + MAX_BATCH_SIZE]
+        batch = service.new_batch_http_request(callback=on_response)
+        for file_id in chunk:
+            batch.add(service.files().get(fileId=file_id, fields=FILE_FIELDS), request_id=file_id)
+        # Each request in a batch counts against the quota
+        execute(batch, cost=len(chunk))
+    return metadata
 
 def search_files(query_name):
     """Search for files by name containing the query_name."""
@@ -81,8 +209,8 @@ def search_files(query_name):
     try:
         # Search for files with name containing the query, not trashed
         q = f"name contains '{query_name}' and trashed = false"
-        results = service.files().list(
-            q=q, pageSize=10, fields="nextPageToken, files(id, name, mimeType)").execute()
+        results = execute(service.files().list(
+            q=q, pageSize=10, fields=f"files({FILE_FIELDS})"))
         items = results.get('files', [])
         return items
     except Exception as e:
@@ -90,10 +218,15 @@ def search_files(query_name):
         return []
 
 def read_file(file_id, mime_type):
-    """Downloads and extracts text from a file."""
+    """
+    Downloads and extracts text from a file.
+
+    Raises:
+        DriveReadError: The file could not be downloaded or its text extracted.
+    """
     service = get_drive_service()
     if not service:
-        return "Error: Could not connect to Drive."
+        raise DriveReadError(file_id, "Could not connect to Drive.")
 
     try:
         request = service.files().get_media(fileId=file_id)
@@ -106,10 +239,14 @@ def read_file(file_id, mime_type):
         downloader = MediaIoBaseDownload(fh, request)
         done = False
         while done is False:
-            status, done = downloader.next_chunk()
+            status, done = drive_limiter.call(downloader.next_chunk)
+    except Exception as e:
+        logger.error(f"Error downloading file {file_id}: {e}")
+        raise DriveReadError(file_id, f"download failed: {e}", retryable=is_quota_error(e) or is_transient_error(e)) from e
 
-        fh.seek(0)
+    fh.seek(0)
 
+    try:
         # Extract text based on mime_type
         if mime_type == 'application/pdf':
             with pdfplumber.open(fh) as pdf:
@@ -117,22 +254,16 @@ def read_file(file_id, mime_type):
                 for page in pdf.pages:
                     text += page.extract_text() or ""
             return text
-        elif 'wordprocessingml' in mime_type: # docx
-            with open("temp.docx", "wb") as f:
-                f.write(fh.read())
-            try:
-                text = docx2txt.process("temp.docx")
-            finally:
-                if os.path.exists("temp.docx"):
-                    os.remove("temp.docx")
-            return text
+        elif 'wordprocessingml' in (mime_type or ''): # docx
+            # Read from memory: a shared temp file would race between concurrent reads
+            return docx2txt.process(fh)
         else:
             # Assume plain text
             return fh.read().decode('utf-8')
 
     except Exception as e:
-        logger.error(f"Error reading file: {e}")
-        return f"Error reading file: {str(e)}"
+        logger.error(f"Error extracting text from file {file_id}: {e}")
+        raise DriveReadError(file_id, f"text extraction failed: {e}") from e
 
 if __name__ == "__main__":
     # Mock test
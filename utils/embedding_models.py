@@ -1,29 +1,114 @@
-import streamlit as st
-from fastembed import TextEmbedding, SparseTextEmbedding, LateInteractionTextEmbedding
+import os
+import time
 import logging
+import threading
+from typing import Dict, Optional, Iterable
+from fastembed import TextEmbedding, SparseTextEmbedding, LateInteractionTextEmbedding
 
 logger = logging.getLogger(__name__)
 
-@st.cache_resource(show_spinner="Loading Embedding Models...")
-def get_embedding_models():
-    """
-    Initializes and caches the FastEmbed models.
-    Returns a tuple: (dense_model, sparse_model, colbert_model)
-    """
-    logger.info("Initializing Embedding Models (Dense, Sparse, ColBERT)...")
+DENSE_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+SPARSE_MODEL_NAME = "prithivida/Splade_PP_en_v1"
+COLBERT_MODEL_NAME = "answerdotai/answerai-colbert-small-v1"
 
-    # Dense (Multilingual, Lightweight)
-    dense_model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-    dense_model = TextEmbedding(model_name=dense_model_name)
+# Keep model files in a stable folder (fastembed defaults to the system temp dir)
+MODEL_CACHE_DIR = os.getenv("FASTEMBED_CACHE_PATH", "./fastembed_cache")
+# Only use files already in MODEL_CACHE_DIR, never download
+OFFLINE = os.getenv("EMBEDDING_OFFLINE", "false").lower() == "true"
 
+MODEL_SPECS = {
+    # Dense (Multilingual, Lightweight)
+    "dense": (TextEmbedding, DENSE_MODEL_NAME),
     # Sparse (BM25)
     # Note: FastEmbed sparse models are limited. Splade is English-optimized but we keep it for hybrid structure.
-    sparse_model_name = "prithivida/Splade_PP_en_v1"
-    sparse_model = SparseTextEmbedding(model_name=sparse_model_name)
-
+    "sparse": (SparseTextEmbedding, SPARSE_MODEL_NAME),
     # ColBERT (Late Interaction, Multilingual, Small)
-    colbert_model_name = "answerdotai/answerai-colbert-small-v1"
-    colbert_model = LateInteractionTextEmbedding(model_name=colbert_model_name)
+    "colbert": (LateInteractionTextEmbedding, COLBERT_MODEL_NAME),
+}
+
+class ModelRegistry:
+    """
+    Loads each FastEmbed model on first use and keeps it for the process lifetime.
+    Independent of Streamlit, so the MCP server and CLI tools can share it.
+    """
+    def __init__(self, cache_dir: Optional[str] = MODEL_CACHE_DIR, offline: bool = OFFLINE):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.load_times: Dict[str, float] = {}
+        self._models = {}
+        self._locks = {name: threading.Lock() for name in MODEL_SPECS}
+        self._warm_thread: Optional[threading.Thread] = None
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._locks[name]:
+            if name not in self._models:
+                self._models[name] = self._load(name)
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def _load(self, name: str):
+        model_class, model_name = MODEL_SPECS[name]
+        kwargs = {"model_name": model_name, "cache_dir": self.cache_dir}
+        if self.offline:
+            kwargs["local_files_only"] = True
+
+        logger.info(f"Loading {name} embedding model {model_name}...")
+        start = time.perf_counter()
+        model = model_class(**kwargs)
+        self.load_times[name] = time.perf_counter() - start
+        logger.info(f"Loaded {name} embedding model in {self.load_times[name]:.2f}s")
+        return model
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Loads models ahead of first use. In background mode this returns at once;
+        callers that need a model before warm-up finishes simply wait on its lock.
+        """
+        names = list(names or MODEL_SPECS)
+        if all(self.is_loaded(name) for name in names):
+            return None
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.error(f"Warm-up failed for {name} embedding model: {e}")
+
+        if not background:
+            load_all()
+            return None
+
+        if self._warm_thread is None or not self._warm_thread.is_alive():
+            self._warm_thread = threading.Thread(target=load_all, name="embedding-warmup", daemon=True)
+            self._warm_thread.start()
+        return self._warm_thread
+
+_REGISTRY = ModelRegistry()
+
+def get_registry() -> ModelRegistry:
+    return _REGISTRY
+
+def get_model(name: str):
+    """Returns one model by name ("dense", "sparse" or "colbert"), loading it if needed."""
+    return _REGISTRY.get(name)
+
+def get_embedding_models():
+    """
+    Returns a tuple: (dense_model, sparse_model, colbert_model)
+    """
+    return get_model("dense"), get_model("sparse"), get_model("colbert")
 
-    logger.info("Embedding Models initialized successfully.")
-    return dense_model, sparse_model, colbert_model
+if __name__ == "__main__":
+    # Download (or verify) all model files into MODEL_CACHE_DIR and report load times
+    logging.basicConfig(level=logging.INFO)
+    registry = get_registry()
+    registry.warm_up(background=False)
+    for name, seconds in registry.load_times.items():
+        print(f"{name:<8} {MODEL_SPECS[name][1]:<60} {seconds:6.2f}s")
@@ -0,0 +1,225 @@
+"""
+Optional out-of-process embedding worker.
+
+Run `python -m utils.embedding_service` and set EMBEDDING_SERVER=127.0.0.1:6390 for the
+app. Nodes then send texts to the worker instead of running the models in the Streamlit
+process. The worker coalesces concurrent requests into one model call and serves
+interactive queries ahead of bulk ingestion batches.
+"""
+import os
+import time
+import queue
+import secrets
+import itertools
+import logging
+import threading
+from dataclasses import dataclass, field
+from multiprocessing.connection import Listener, Client
+from typing import List, Optional, Tuple
+
+from utils.embedding_models import get_model, get_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = "127.0.0.1:6390"
+# Unset means embed in-process
+EMBEDDING_SERVER = os.getenv("EMBEDDING_SERVER")
+# Shared secret for the socket (peers exchange pickles, so never run without one).
+# If unset, the server generates a key at startup and writes it to AUTHKEY_FILE,
+# readable only by its user, for clients on the same machine to read.
+AUTHKEY = os.getenv("EMBEDDING_SERVER_AUTHKEY")
+AUTHKEY_FILE = os.getenv("EMBEDDING_SERVER_AUTHKEY_FILE", os.path.expanduser("~/.drive_rag_embedding.key"))
+
+# Lower runs first
+LANES = {"interactive": 0, "bulk": 1}
+# Bulk work is sent in slices this size so queries can run between them
+BULK_SLICE_SIZE = 64
+MAX_BATCH_TEXTS = 256
+MAX_WAIT_MS = 5
+
+def _parse_address(address: str) -> Tuple[str, int]:
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+@dataclass(order=True)
+class _Request:
+    lane: int
+    seq: int
+    model: str = field(compare=False)
+    texts: List[str] = field(compare=False)
+    conn: object = field(compare=False)
+    req_id: int = field(compare=False)
+
+def server_authkey() -> bytes:
+    """The configured key, or a new random one written to AUTHKEY_FILE (mode 0600)."""
+    if AUTHKEY:
+        return AUTHKEY.encode()
+
+    key = secrets.token_hex(32)
+    fd = os.open(AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # The mode argument does not apply to an existing file
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    logger.info(f"Embedding server key written to {AUTHKEY_FILE}")
+    return key.encode()
+
+def client_authkey() -> bytes:
+    """The configured key, else the one the server wrote to AUTHKEY_FILE."""
+    if AUTHKEY:
+        return AUTHKEY.encode()
+    try:
+        with open(AUTHKEY_FILE) as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        key = ""
+    if not key:
+        raise PermissionError(
+            f"No embedding server key: set EMBEDDING_SERVER_AUTHKEY or start the server to create {AUTHKEY_FILE}"
+        )
+    return key.encode()
+
+class EmbeddingServer:
+    """
+    Serves embed requests over a local socket with one batching thread.
+    """
+    def __init__(self, address: str = DEFAULT_ADDRESS, max_batch: int = MAX_BATCH_TEXTS, max_wait_ms: float = MAX_WAIT_MS):
+        self.address = _parse_address(address)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.PriorityQueue[_Request]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+
+    def serve_forever(self) -> None:
+        get_registry().warm_up(background=False)
+        threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True).start()
+
+        with Listener(self.address, backlog=64, authkey=server_authkey()) as listener:
+            logger.info(f"Embedding server listening on {self.address[0]}:{self.address[1]}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn) -> None:
+        try:
+            while True:
+                req_id, model, texts, priority = conn.recv()
+                self._queue.put(_Request(LANES.get(priority, 0), next(self._seq), model, texts, conn, req_id))
+        except (EOFError, OSError):
+            conn.close()
+
+    def _next_batch(self) -> List[_Request]:
+        first = self._queue.get()
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item.lane != first.lane:
+                # Never hold a query back behind a bulk slice (or vice versa)
+                self._queue.put(item)
+                break
+            batch.append(item)
+            size += len(item.texts)
+        return batch
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            by_model = {}
+            for req in batch:
+                by_model.setdefault(req.model, []).append(req)
+
+            for model, reqs in by_model.items():
+                texts = [t for req in reqs for t in req.texts]
+                try:
+                    vectors = list(get_model(model).embed(texts))
+                    error = None
+                except Exception as e:
+                    logger.error(f"Embedding {len(texts)} texts with {model} failed: {e}")
+                    vectors, error = [], str(e)
+
+                offset = 0
+                for req in reqs:
+                    result = vectors[offset:offset + len(req.texts)]
+                    offset += len(req.texts)
+                    try:
+                        req.conn.send((req.req_id, error, result))
+                    except (EOFError, OSError):
+                        pass
+
+class EmbeddingClient:
+    """
+    Thread-safe client: each thread keeps its own connection, so concurrent
+    sessions reach the server at the same time and can be batched together.
+    """
+    def __init__(self, address: str):
+        self.address = _parse_address(address)
+        self._local = threading.local()
+        self._ids = itertools.count()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Read per connection, so a restarted server's new key is picked up
+            conn = Client(self.address, authkey=client_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _call(self, model: str, texts: List[str], priority: str) -> list:
+        conn = self._conn()
+        req_id = next(self._ids)
+        try:
+            conn.send((req_id, model, texts, priority))
+            resp_id, error, result = conn.recv()
+        except (EOFError, OSError):
+            self._local.conn = None
+            raise
+        if error:
+            raise RuntimeError(f"Embedding server error: {error}")
+        return result
+
+    def embed(self, model: str, texts: List[str], priority: str = "interactive") -> list:
+        if priority != "bulk":
+            return self._call(model, texts, priority)
+
+        results = []
+        for i in range(0, len(texts), BULK_SLICE_SIZE):
+            results.extend(self._call(model, texts[i:i + BULK_SLICE_SIZE], priority))
+        return results
+
+_CLIENT: Optional[EmbeddingClient] = None
+
+def get_embedding_client() -> Optional[EmbeddingClient]:
+    global _CLIENT
+    if EMBEDDING_SERVER and _CLIENT is None:
+        _CLIENT = EmbeddingClient(EMBEDDING_SERVER)
+    return _CLIENT
+
+def embed(model: str, texts: List[str], priority: str = "interactive") -> list:
+    """
+    Embeds texts with the named model ("dense", "sparse" or "colbert").
+    Uses the embedding server when EMBEDDING_SERVER is set, else the in-process model.
+    priority is "interactive" for user queries and "bulk" for ingestion.
+    """
+    if not texts:
+        return []
+
+    client = get_embedding_client()
+    if client is not None:
+        try:
+            return client.embed(model, texts, priority)
+        except (ConnectionRefusedError, EOFError, OSError) as e:
+            logger.warning(f"Embedding server unavailable ({e}), embedding in-process.")
+
+    return list(get_model(model).embed(texts))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    EmbeddingServer(EMBEDDING_SERVER or DEFAULT_ADDRESS).serve_forever()
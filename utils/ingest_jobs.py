@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from typing import Optional, List, Dict
+
+from utils.vector_store import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB = os.path.join(DB_PATH, "ingest_jobs.sqlite")
+
+# Ingestion jobs running at once in this process; further jobs wait as "queued"
+MAX_INGEST_JOBS = int(os.getenv("MAX_INGEST_JOBS", "1"))
+
+# Seconds between progress writes to the job table (memory is always current)
+PERSIST_INTERVAL = 1.0
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"  # Process exited while the job was queued or running
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+_FIELDS = [
+    "job_id", "folder_id", "status", "stage", "done", "total", "detail",
+    "files_done", "files_total", "chunks_done", "chunks_total",
+    "message", "created_at", "started_at", "stage_started_at", "finished_at",
+]
+
+class JobCancelled(Exception):
+    pass
+
+class IngestJobManager:
+    """
+    Runs ingestion flows on background threads and records them in a job table.
+
+    Progress comes from the flow's shared["on_progress"] callback, which also
+    raises JobCancelled when the job was cancelled, so a cancelled job stops at
+    the next file or batch. Files finished before that stay in the ingest
+    journal, and a new job for the folder resumes from there.
+    """
+    def __init__(self, path: str = JOBS_DB, max_jobs: int = MAX_INGEST_JOBS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_jobs)
+        self._jobs: Dict[str, Dict] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, folder_id TEXT, status TEXT, stage TEXT, done INTEGER, total INTEGER,"
+            " detail TEXT, files_done INTEGER, files_total INTEGER, chunks_done INTEGER, chunks_total INTEGER,"
+            " message TEXT, created_at REAL, started_at REAL, stage_started_at REAL, finished_at REAL)"
+        )
+        # Jobs left active by a previous process will never finish
+        self._conn.execute(
+            f"UPDATE jobs SET status = ?, finished_at = ? WHERE status IN ({','.join('?' * len(ACTIVE_STATES))})",
+            (INTERRUPTED, time.time(), *ACTIVE_STATES),
+        )
+        self._conn.commit()
+
+    def submit(self, folder_id: str) -> str:
+        """Starts ingesting a folder, or returns the active job already ingesting it."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job["folder_id"] == folder_id and job["status"] in ACTIVE_STATES:
+                    return job["job_id"]
+
+            job_id = uuid.uuid4().hex[:12]
+            job = dict.fromkeys(_FIELDS)
+            job.update(job_id=job_id, folder_id=folder_id, status=QUEUED, created_at=time.time())
+            self._jobs[job_id] = job
+            self._cancel[job_id] = threading.Event()
+            self._persist(job)
+
+        threading.Thread(target=self._run, args=(job_id,), name=f"ingest-{job_id}", daemon=True).start()
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        event = self._cancel.get(job_id)
+        if event is None or self._jobs[job_id]["status"] not in ACTIVE_STATES:
+            return False
+        event.set()
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job state with throughput (units/s of the current stage) and ETA (s)."""
+        with self._lock:
+            live = self._jobs.get(job_id)
+            job = {k: v for k, v in live.items() if not k.startswith("_")} if live else None
+        if job is None:
+            job = self._load(job_id)
+        if job is None:
+            return None
+
+        job["throughput"], job["eta"] = None, None
+        if job["status"] == RUNNING and job["done"] and job["stage_started_at"]:
+            elapsed = time.time() - job["stage_started_at"]
+            if elapsed > 0:
+                job["throughput"] = job["done"] / elapsed
+                job["eta"] = (job["total"] - job["done"]) / job["throughput"]
+        return job
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        """Most recent jobs first, including those of previous processes."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self.get(row[0]) or dict(zip(_FIELDS, row)) for row in rows]
+
+    def _run(self, job_id: str) -> None:
+        # Local import: flow imports the nodes, which load the embedding stack
+        from flow import get_ingestion_flow
+
+        job, cancelled = self._jobs[job_id], self._cancel[job_id]
+        with self._slots:
+            if cancelled.is_set():
+                self._finish(job, CANCELLED, "Cancelled before start.")
+                return
+            self._update(job, force=True, status=RUNNING, started_at=time.time())
+
+            def on_progress(stage, done, total, detail=""):
+                if cancelled.is_set():
+                    raise JobCancelled()
+                now = time.time()
+                changes = dict(done=done, total=total, detail=detail)
+                if stage != job["stage"]:
+                    # A stage starts when the previous one finished, not at its first report
+                    changes.update(stage=stage, stage_started_at=job.get("_stage_ended") or job["started_at"])
+                if done == total:
+                    changes["_stage_ended"] = now
+                if stage == "download":
+                    changes.update(files_done=done, files_total=total)
+                elif stage == "index":
+                    changes.update(chunks_done=done, chunks_total=total)
+                self._update(job, force=done == total, **changes)
+
+            shared = {"folder_id": job["folder_id"], "on_progress": on_progress}
+            try:
+                get_ingestion_flow().run(shared)
+                message = shared.get("index_status", "Ingestion completed!")
+                dedup = shared.get("dedup_stats")
+                if dedup and dedup["chunks_in"] > dedup["chunks_out"]:
+                    message += f" Skipped {dedup['chunks_in'] - dedup['chunks_out']} duplicate chunks ({dedup['removed_pct']}%)."
+                failed = shared.get("failed_files", [])
+                if failed:
+                    message += f" {len(failed)} files could not be read and will be retried on the next run: " + \
+                        ", ".join(f["name"] for f in failed)
+                self._finish(job, SUCCEEDED, message)
+            except JobCancelled:
+                self._finish(job, CANCELLED, "Cancelled. Files already indexed are kept.")
+            except Exception as e:
+                logger.exception(f"Ingestion job {job_id} failed")
+                self._finish(job, FAILED, str(e))
+
+    def _finish(self, job: Dict, status: str, message: str) -> None:
+        self._update(job, force=True, status=status, message=message, finished_at=time.time())
+
+    def _update(self, job: Dict, force: bool = False, **changes) -> None:
+        with self._lock:
+            job.update(changes)
+            now = time.monotonic()
+            if force or now - job.get("_persisted", 0) >= PERSIST_INTERVAL:
+                job["_persisted"] = now
+                self._persist(job)
+
+    def _persist(self, job: Dict) -> None:
+        # Caller holds self._lock
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(_FIELDS)}) VALUES ({', '.join('?' * len(_FIELDS))})",
+            [job[f] for f in _FIELDS],
+        )
+        self._conn.commit()
+
+    def _load(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(_FIELDS, row)) if row else None
+
+_MANAGER: Optional[IngestJobManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+def get_job_manager() -> IngestJobManager:
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = IngestJobManager()
+        return _MANAGER
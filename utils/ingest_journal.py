@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, List, Dict, Iterable
+
+from utils.vector_store import DB_PATH
+
+JOURNAL_DB = os.path.join(DB_PATH, "ingest_journal.sqlite")
+
+# File states, in the order ingestion moves through them
+DOWNLOADED = "downloaded"  # Content fetched from Drive and kept here, not yet in Qdrant
+INDEXED = "indexed"        # All chunks upserted
+EMPTY = "empty"            # No extractable text; nothing to index
+FAILED = "failed"          # Download or extraction failed; tried again on the next run
+
+class IngestJournal:
+    """
+    Local record of ingestion progress per Drive file.
+
+    Content is committed as soon as a file is downloaded and the file is marked
+    indexed right after its chunks are upserted, so an interrupted run resumes
+    without re-downloading or re-indexing finished files.
+    """
+    def __init__(self, path: str = JOURNAL_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " file_id TEXT PRIMARY KEY, folder_id TEXT, name TEXT, mime_type TEXT,"
+            " status TEXT NOT NULL, content TEXT, chunks INTEGER, updated_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_folder ON files (folder_id)")
+        # Index generation: bumped after every ingestion, so search caches in
+        # other processes sharing the index know their results are stale
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        try:
+            # Journals created before failures were recorded
+            self._conn.execute("ALTER TABLE files ADD COLUMN error TEXT")
+        except sqlite3.OperationalError:
+            pass
+        self._conn.commit()
+
+    def record_download(self, folder_id: str, file: Dict, content: Optional[str]) -> None:
+        status = DOWNLOADED if content and content.strip() else EMPTY
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, folder_id, name, mime_type, status, content, chunks, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, NULL, ?)",
+                (file["id"], folder_id, file["name"], file["mimeType"], status, content, time.time()),
+            )
+            self._conn.commit()
+
+    def record_indexed(self, folder_id: str, file: Dict, chunks: int) -> None:
+        """Records a file found already indexed (no content kept)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, folder_id, name, mime_type, status, content, chunks, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, NULL, ?, ?)",
+                (file["id"], folder_id, file["name"], file["mimeType"], INDEXED, chunks, time.time()),
+            )
+            self._conn.commit()
+
+    def record_failure(self, folder_id: str, file: Dict, error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, folder_id, name, mime_type, status, content, chunks, updated_at, error)"
+                " VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, ?)",
+                (file["id"], folder_id, file["name"], file["mimeType"], FAILED, time.time(), error),
+            )
+            self._conn.commit()
+
+    def get_failures(self, folder_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_id, name, error FROM files WHERE folder_id = ? AND status = ?", (folder_id, FAILED)
+            ).fetchall()
+        return [{"id": file_id, "name": name, "error": error} for file_id, name, error in rows]
+
+    def mark_indexed(self, chunk_counts: Dict[str, int]) -> None:
+        """Marks files indexed, given {file_id: number of chunks upserted}."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE files SET status = ?, chunks = ?, updated_at = ? WHERE file_id = ?",
+                ((INDEXED, count, time.time(), file_id) for file_id, count in chunk_counts.items()),
+            )
+            self._conn.commit()
+
+    def get_states(self, file_ids: Iterable[str]) -> Dict[str, str]:
+        keys = list(file_ids)
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT file_id, status FROM files WHERE file_id IN ({placeholders})", keys
+            ).fetchall()
+        return dict(rows)
+
+    def get_content(self, file_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return row[0] if row else None
+
+    def summary(self, folder_id: Optional[str] = None) -> Dict[str, int]:
+        """Number of files per state, optionally for one folder."""
+        query = "SELECT status, COUNT(*) FROM files"
+        args: List[str] = []
+        if folder_id:
+            query += " WHERE folder_id = ?"
+            args.append(folder_id)
+        with self._lock:
+            rows = self._conn.execute(query + " GROUP BY status", args).fetchall()
+        return dict(rows)
+
+    def list_folders(self) -> Dict[str, int]:
+        """Journaled folders with their number of indexed files."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT folder_id, SUM(status = ?) FROM files GROUP BY folder_id ORDER BY MAX(updated_at) DESC", (INDEXED,)
+            ).fetchall()
+        return {folder_id: count for folder_id, count in rows}
+
+    def index_generation(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'index_generation'").fetchone()
+        return row[0] if row else 0
+
+    def bump_index_generation(self) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('index_generation', 1)"
+                " ON CONFLICT (key) DO UPDATE SET value = value + 1"
+            )
+            self._conn.commit()
+
+    def forget_folder(self, folder_id: str) -> None:
+        """Drops a folder's records so its next ingestion starts from scratch."""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE folder_id = ?", (folder_id,))
+            self._conn.commit()
+
+_JOURNAL: Optional[IngestJournal] = None
+_JOURNAL_LOCK = threading.Lock()
+
+def get_ingest_journal() -> IngestJournal:
+    global _JOURNAL
+    with _JOURNAL_LOCK:
+        if _JOURNAL is None:
+            _JOURNAL = IngestJournal()
+        return _JOURNAL
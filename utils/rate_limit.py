@@ -0,0 +1,128 @@
+import time
+import random
+import threading
+import logging
+from typing import Callable, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: up to `rate` acquisitions per second on average,
+    with bursts of up to `burst`.
+    """
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Blocks until `tokens` are available. Returns the seconds waited.
+        A cost above `burst` is taken in burst-sized slices, each waiting for
+        the bucket to refill, so it is charged in full.
+        """
+        waited = 0.0
+        while tokens > 0:
+            take = min(tokens, self.burst)
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= take:
+                    self._tokens -= take
+                    tokens -= take
+                    continue
+                delay = (take - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+        return waited
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate adapts to quota errors (AIMD).
+
+    Every call takes a token. When a call fails with a quota error the rate is
+    halved and the call is retried after an exponential backoff with jitter;
+    each success raises the rate again by a small step, up to max_rate.
+    """
+    def __init__(
+        self,
+        max_rate: float,
+        burst: float,
+        min_rate: float = 0.5,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 64.0,
+        is_quota_error: Optional[Callable[[Exception], bool]] = None,
+        is_transient_error: Optional[Callable[[Exception], bool]] = None,
+    ):
+        """
+        Args:
+            max_rate: Calls per second when no quota errors are seen.
+            burst: Calls allowed back to back.
+            min_rate: Floor for the adapted rate.
+            max_retries: Retries per call for quota and transient errors.
+            base_delay / max_delay: Exponential backoff bounds, in seconds.
+            is_quota_error: Errors that should slow the limiter down and be retried.
+            is_transient_error: Errors that should be retried at the current rate.
+        """
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_quota_error = is_quota_error or (lambda e: False)
+        self.is_transient_error = is_transient_error or (lambda e: False)
+        self.bucket = TokenBucket(max_rate, burst)
+        self.quota_errors = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def _slow_down(self) -> None:
+        with self._lock:
+            self.quota_errors += 1
+            self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+
+    def _speed_up(self) -> None:
+        if self.bucket.rate < self.max_rate:
+            with self._lock:
+                self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate / 20))
+
+    def call(self, fn: Callable[..., Any], *args, cost: float = 1, **kwargs) -> Any:
+        """Runs fn(*args, **kwargs) within the rate limit, retrying quota and transient errors."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(cost)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                quota = self.is_quota_error(e)
+                if attempt == self.max_retries or not (quota or self.is_transient_error(e)):
+                    raise
+                if quota:
+                    self._slow_down()
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(
+                    f"{'Quota' if quota else 'Transient'} error ({e}); retry {attempt + 1}/{self.max_retries} "
+                    f"in {delay:.1f}s at {self.rate:.1f} calls/s"
+                )
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+            else:
+                self._speed_up()
+                return result
@@ -0,0 +1,190 @@
+import os
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+from qdrant_client.models import Prefetch, SparseVector, QueryRequest
+
+from utils.embedding_service import embed
+from utils.vector_store import COLLECTION_NAME, get_qdrant_client, search_payload_selector, folder_filter
+
+QUERY_MODELS = ("dense", "sparse", "colbert")
+
+# Candidates fetched by each first-stage (dense / sparse) prefetch before ColBERT re-ranking
+PREFETCH_LIMIT = 20
+
+# Diversification of the re-ranked candidates (see diversify):
+# MMR trade-off, 1.0 = relevance only, lower = more varied results
+SEARCH_MMR_LAMBDA = float(os.getenv("SEARCH_MMR_LAMBDA", "0.7"))
+# Most results taken from one file (0 = no cap)
+SEARCH_MAX_PER_FILE = int(os.getenv("SEARCH_MAX_PER_FILE", "2"))
+# ColBERT-ranked candidates to diversify, at least twice the requested limit
+DIVERSIFY_CANDIDATES = 20
+
+# Queries per query_batch_points request in batch_search
+SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", "64"))
+
+def _query_vector(kind: str, vector):
+    if kind == "sparse":
+        return SparseVector(**vector.as_object())
+    return vector.tolist()
+
+def embed_query(kind: str, query: str):
+    """Query vector for one model, in the form Qdrant's query API expects."""
+    # Models expect list of strings
+    return _query_vector(kind, embed(kind, [query])[0])
+
+def embed_queries(kind: str, queries: List[str], priority: str = "bulk") -> List:
+    """Query vectors for many queries with one embedding call."""
+    return [_query_vector(kind, vector) for vector in embed(kind, queries, priority=priority)]
+
+def _unit_rows(vectors) -> np.ndarray:
+    m = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(norms == 0, 1, norms)
+
+def diversify(points: List, limit: int, mmr_lambda: float = SEARCH_MMR_LAMBDA,
+              max_per_file: int = SEARCH_MAX_PER_FILE) -> List:
+    """
+    Picks limit points from relevance-ranked candidates with Maximal Marginal
+    Relevance over their dense vectors, taking at most max_per_file points
+    from one file while other files have candidates left.
+
+    Relevance is the candidate score scaled to [0, 1]; redundancy is the
+    highest cosine similarity to an already picked point. Points need
+    vector["dense"] (with_vectors=["dense"]); the vectors are dropped from
+    the returned points.
+    """
+    if not points:
+        return []
+
+    scores = np.array([p.score or 0.0 for p in points], dtype=np.float32)
+    span = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / span if span > 0 else np.ones_like(scores)
+    vectors = _unit_rows([p.vector["dense"] for p in points])
+    similarity = vectors @ vectors.T
+
+    picked: List[int] = []
+    per_file: Dict[str, int] = {}
+    redundancy = np.zeros(len(points), dtype=np.float32)
+    while len(picked) < min(limit, len(points)):
+        mmr = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        mmr[picked] = -np.inf
+        capped = [
+            i for i, p in enumerate(points)
+            if max_per_file and per_file.get((p.payload or {}).get("file_id"), 0) >= max_per_file
+        ]
+        open_mmr = mmr.copy()
+        open_mmr[capped] = -np.inf
+        # Only go over the cap when every remaining candidate is capped
+        best = int(np.argmax(open_mmr if np.isfinite(open_mmr).any() else mmr))
+
+        picked.append(best)
+        file_id = (points[best].payload or {}).get("file_id")
+        per_file[file_id] = per_file.get(file_id, 0) + 1
+        redundancy = np.maximum(redundancy, similarity[best])
+
+    for p in points:
+        p.vector = None
+    return [points[i] for i in picked]
+
+def _query_args(vectors: Dict[str, Any], limit: int, diversified: bool, query_filter=None) -> Dict[str, Any]:
+    """
+    Hybrid query parameters, shared by query_points and QueryRequest. The
+    filter goes into each prefetch here; callers also pass it to the main
+    query (query_filter / filter), so only matching points are scanned.
+    """
+    candidates = max(DIVERSIFY_CANDIDATES, 2 * limit) if diversified else limit
+    prefetch_limit = max(PREFETCH_LIMIT, candidates)
+
+    # We fetch more candidates to re-rank with ColBERT
+    return dict(
+        prefetch=[
+            # Prefetch with Dense
+            Prefetch(
+                query=vectors["dense"],
+                using="dense",
+                filter=query_filter,
+                limit=prefetch_limit
+            ),
+            # Prefetch with Sparse
+            Prefetch(
+                query=vectors["sparse"],
+                using="sparse",
+                filter=query_filter,
+                limit=prefetch_limit
+            )
+        ],
+        # Main query using ColBERT to re-rank the prefetched results
+        query=vectors["colbert"],
+        using="colbert",
+        limit=candidates,
+        with_payload=search_payload_selector()
+    )
+
+def hybrid_search(query: str, limit: int = 5, query_vectors: Optional[Dict[str, Any]] = None,
+                  mmr_lambda: float = SEARCH_MMR_LAMBDA, max_per_file: int = SEARCH_MAX_PER_FILE,
+                  folder_ids: Optional[List[str]] = None) -> List:
+    """
+    Hybrid search (Dense + Sparse prefetch) with late interaction (ColBERT) re-ranking.
+
+    Args:
+        query: User query.
+        limit: Number of points to return.
+        query_vectors: Precomputed {"dense", "sparse", "colbert"} query vectors;
+            missing ones are embedded here.
+        mmr_lambda / max_per_file: Diversification of the ColBERT top
+            candidates (see diversify); 1.0 and 0 return the plain top limit.
+        folder_ids: Drive folders to search; None or empty searches all of them.
+
+    Returns:
+        Scored points, best first (in pick order when diversified). Payload
+        text may need hydrate_chunk_text.
+    """
+    vectors = dict(query_vectors or {})
+    for kind in QUERY_MODELS:
+        if vectors.get(kind) is None:
+            vectors[kind] = embed_query(kind, query)
+
+    diversified = mmr_lambda < 1 or max_per_file > 0
+    query_filter = folder_filter(folder_ids)
+    points = get_qdrant_client().query_points(
+        collection_name=COLLECTION_NAME,
+        **_query_args(vectors, limit, diversified, query_filter),
+        query_filter=query_filter,
+        with_vectors=["dense"] if diversified else False
+    ).points
+
+    if not diversified:
+        return points
+    return diversify(points, limit, mmr_lambda, max_per_file)
+
+def batch_search(queries: List[str], limit: int = 5, mmr_lambda: float = SEARCH_MMR_LAMBDA,
+                 max_per_file: int = SEARCH_MAX_PER_FILE, batch_size: int = SEARCH_BATCH_SIZE,
+                 folder_ids: Optional[List[str]] = None) -> List[List]:
+    """
+    hybrid_search for many queries (in the same folders): each slice of batch_size queries is
+    embedded with one call per model and searched with one query_batch_points
+    request.
+
+    Returns:
+        One list of scored points per query, in the order of queries.
+    """
+    client = get_qdrant_client()
+    diversified = mmr_lambda < 1 or max_per_file > 0
+    query_filter = folder_filter(folder_ids)
+    results: List[List] = []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        by_model = {kind: embed_queries(kind, batch) for kind in QUERY_MODELS}
+        requests = [
+            QueryRequest(
+                **_query_args({kind: by_model[kind][i] for kind in QUERY_MODELS}, limit, diversified, query_filter),
+                filter=query_filter,
+                with_vector=["dense"] if diversified else False
+            )
+            for i in range(len(batch))
+        ]
+        for response in client.query_batch_points(collection_name=COLLECTION_NAME, requests=requests):
+            points = response.points
+            results.append(diversify(points, limit, mmr_lambda, max_per_file) if diversified else points)
+    return results
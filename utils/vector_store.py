@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import threading
+import logging
+from typing import Optional, List, Dict, Iterable, Tuple
+from qdrant_client import QdrantClient
+from qdrant_client.models import Filter, FieldCondition, MatchAny, KeywordIndexParams, KeywordIndexType
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "./qdrant_db"
+COLLECTION_NAME = "drive_docs_vn"
+
+# Qdrant server URL. Unset means local (path) mode, which only one process can open;
+# set it when the app, the MCP server and ingestion run as separate processes.
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+
+# Where chunk text lives: "payload" (inside each Qdrant point) or "sqlite" (separate local store)
+CHUNK_TEXT_STORE = os.getenv("CHUNK_TEXT_STORE", "payload").lower()
+CHUNK_TEXT_DB = os.path.join(DB_PATH, "chunk_text.sqlite")
+
+# Payload key partitioning the index: every point carries the Drive folder it was ingested from
+TENANT_FIELD = "folder_id"
+
+# Payload keys search needs when text is kept outside Qdrant
+METADATA_FIELDS = ["source", "file_id", "chunk_index", "sources", "file_ids", TENANT_FIELD]
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+def get_qdrant_client() -> QdrantClient:
+    """
+    Returns a process-wide Qdrant client.
+    Local (path) mode locks the storage folder, so every node must share one instance.
+    """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            if QDRANT_URL:
+                _CLIENT = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+            else:
+                os.makedirs(DB_PATH, exist_ok=True)
+                _CLIENT = QdrantClient(path=DB_PATH)
+        return _CLIENT
+
+def create_tenant_index(client: QdrantClient, collection_name: str) -> None:
+    """
+    Tenant keyword index on the folder: Qdrant stores each folder's points
+    together and serves folder-filtered searches from that folder's data only.
+    """
+    client.create_payload_index(
+        collection_name=collection_name,
+        field_name=TENANT_FIELD,
+        field_schema=KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True),
+    )
+
+def folder_filter(folder_ids: Optional[Iterable[str]]) -> Optional[Filter]:
+    """Filter restricting a search to the given folders; None searches every folder."""
+    folder_ids = sorted(set(folder_ids or []))
+    if not folder_ids:
+        return None
+    return Filter(must=[FieldCondition(key=TENANT_FIELD, match=MatchAny(any=folder_ids))])
+
+def external_text_enabled() -> bool:
+    return CHUNK_TEXT_STORE == "sqlite"
+
+def search_payload_selector():
+    """with_payload value for search requests: skip the text when it is stored externally."""
+    return METADATA_FIELDS if external_text_enabled() else True
+
+class ChunkTextStore:
+    """
+    Compact key-value store for chunk text, keyed by Qdrant point id.
+    """
+    def __init__(self, path: str = CHUNK_TEXT_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunk_text (point_id TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        self._conn.commit()
+
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_text (point_id, text) VALUES (?, ?)",
+                ((str(point_id), text) for point_id, text in items),
+            )
+            self._conn.commit()
+
+    def get_many(self, point_ids: List[str]) -> Dict[str, str]:
+        if not point_ids:
+            return {}
+        keys = [str(p) for p in point_ids]
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT point_id, text FROM chunk_text WHERE point_id IN ({placeholders})", keys
+            ).fetchall()
+        return dict(rows)
+
+_TEXT_STORE: Optional[ChunkTextStore] = None
+
+def get_chunk_text_store() -> ChunkTextStore:
+    global _TEXT_STORE
+    with _CLIENT_LOCK:
+        if _TEXT_STORE is None:
+            _TEXT_STORE = ChunkTextStore()
+        return _TEXT_STORE
+
+def _payload_texts(point_ids: List[str]) -> Dict[str, str]:
+    """Text of points indexed before the external store was enabled, read from their payload."""
+    records = get_qdrant_client().retrieve(
+        collection_name=COLLECTION_NAME, ids=point_ids, with_payload=["text"], with_vectors=False
+    )
+    return {str(r.id): (r.payload or {}).get("text") for r in records if (r.payload or {}).get("text") is not None}
+
+def hydrate_chunk_text(points) -> None:
+    """
+    Fills payload['text'] in place for points returned without it.
+    Points the store has no text for (indexed with the text in their payload)
+    are read from Qdrant, and their text is copied into the store.
+    """
+    missing = [p for p in points if "text" not in (p.payload or {})]
+    if not missing:
+        return
+
+    store = get_chunk_text_store()
+    texts = store.get_many([p.id for p in missing])
+    unstored = [p.id for p in missing if str(p.id) not in texts]
+    if unstored:
+        from_payload = _payload_texts(unstored)
+        if from_payload:
+            store.put_many(from_payload.items())
+            texts.update(from_payload)
+
+    for p in missing:
+        if p.payload is None:
+            p.payload = {}
+        text = texts.get(str(p.id))
+        if text is None:
+            logger.warning(f"No stored text for point {p.id}")
+        p.payload["text"] = text or ""
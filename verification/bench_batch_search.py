@@ -0,0 +1,67 @@
+"""
+Throughput of batch_search against a per-query hybrid_search loop.
+
+Run from the repo root against an ingested index:
+    python -m verification.bench_batch_search [n_queries] [--file queries.txt]
+
+Without --file, queries are the first words of chunks sampled from the index.
+The loop embeds each query with three single-item calls and sends one
+query_points request per query (what the retrieval flow does per run);
+batch_search embeds SEARCH_BATCH_SIZE queries per model call and sends them
+in one query_batch_points request. Results of both are compared.
+"""
+import sys
+import time
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.search import SEARCH_BATCH_SIZE, hybrid_search, batch_search
+from utils.vector_store import COLLECTION_NAME, get_qdrant_client, hydrate_chunk_text
+
+QUERY_WORDS = 8
+
+def sample_queries(n):
+    points, _ = get_qdrant_client().scroll(collection_name=COLLECTION_NAME, limit=n, with_payload=True)
+    hydrate_chunk_text(points)
+    queries = [" ".join((p.payload or {}).get("text", "").split()[:QUERY_WORDS]) for p in points]
+    return [q for q in queries if q]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("n_queries", nargs="?", type=int, default=500)
+    parser.add_argument("--file", help="file with one query per line")
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()][:args.n_queries]
+    else:
+        queries = sample_queries(args.n_queries)
+    if not queries:
+        print("No queries: ingest a folder first or pass --file.")
+        return 1
+
+    # Load the models and open the index outside the timings
+    hybrid_search(queries[0], limit=args.limit)
+
+    start = time.perf_counter()
+    looped = [hybrid_search(q, limit=args.limit) for q in queries]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = batch_search(queries, limit=args.limit)
+    batch_seconds = time.perf_counter() - start
+
+    same = sum([p.id for p in a] == [p.id for p in b] for a, b in zip(looped, batched))
+    print(f"{len(queries)} queries, top {args.limit}, batches of {SEARCH_BATCH_SIZE}")
+    print(f"  per-query loop : {loop_seconds:7.2f}s  {len(queries) / loop_seconds:8.1f} queries/s")
+    print(f"  batch_search   : {batch_seconds:7.2f}s  {len(queries) / batch_seconds:8.1f} queries/s")
+    print(f"  speed-up x{loop_seconds / batch_seconds:.1f}; identical results for {same}/{len(queries)} queries")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Compares the old character splitter with the token-aware chunker.
+
+Run from the repo root:
+    python -m verification.bench_chunking [folder_with_txt_files]
+
+Reports chunks/sec and how many word-pieces the dense model would truncate.
+"""
+import os
+import sys
+import time
+import random
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.chunking import chunk_documents, get_chunk_tokenizer, truncation_stats
+
+WORDS = (
+    "tài liệu báo cáo doanh thu quý năm kế hoạch dự án nhân sự hợp đồng "
+    "report revenue quarter plan project contract budget meeting summary"
+).split()
+
+def synthetic_documents(n_docs=50, paragraphs=40, seed=0):
+    rng = random.Random(seed)
+    docs = []
+    for d in range(n_docs):
+        text = "\n\n".join(
+            ". ".join(" ".join(rng.choices(WORDS, k=rng.randint(8, 20))) for _ in range(rng.randint(3, 8)))
+            for _ in range(paragraphs)
+        )
+        docs.append({"name": f"doc_{d}.txt", "id": f"doc_{d}", "content": text})
+    return docs
+
+def load_documents(folder):
+    docs = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.endswith(".txt") and os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                docs.append({"name": name, "id": name, "content": f.read()})
+    return docs
+
+def legacy_chunks(documents):
+    # Splitter as ChunkNode used to build it, once per run
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
+    return [c for doc in documents for c in splitter.split_text(doc['content'])]
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def report(label, texts, elapsed):
+    stats = truncation_stats(texts)
+    lost = stats["truncated_tokens"] / max(stats["tokens"], 1)
+    print(f"{label:<14} {len(texts):>7} chunks  {len(texts) / elapsed:>9.1f} chunks/s  "
+          f"truncated {stats['truncated_chunks']:>6} chunks, {lost:6.1%} of tokens")
+
+if __name__ == "__main__":
+    documents = load_documents(sys.argv[1]) if len(sys.argv) > 1 else synthetic_documents()
+    print(f"{len(documents)} documents, {sum(len(d['content']) for d in documents)} characters")
+
+    # Load the tokenizer outside the timed sections
+    get_chunk_tokenizer()
+
+    texts, elapsed = timed(legacy_chunks, documents)
+    report("char/1000", texts, elapsed)
+
+    chunks, elapsed = timed(chunk_documents, documents, 1)
+    report("token/serial", [c["text"] for c in chunks], elapsed)
+
+    chunks, elapsed = timed(chunk_documents, documents)
+    report("token/threads", [c["text"] for c in chunks], elapsed)
@@ -0,0 +1,91 @@
+"""
+Measures per-request orchestration overhead of the retrieval flow.
+
+Run from the repo root:
+    python -m verification.bench_flow_reuse [n_requests]
+
+Compares building and instrumenting a traced flow for every request (what
+app.py used to do) with reusing one flow built at startup, for sampled and
+unsampled runs. The nodes are stubs, so the numbers are framework overhead
+only: graph construction, trace_flow patching, Flow._orch and span export.
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pocketflow import Node, Flow
+from tracing import LangfuseTracer, TracingConfig, trace_flow
+from verification.bench_trace_overhead import FakeCollector
+
+class SearchNode(Node):
+    def prep(self, shared):
+        return shared["user_query"]
+
+    def exec(self, query):
+        return [{"text": f"chunk {i} for {query}", "source": "doc.txt"} for i in range(5)]
+
+    def post(self, shared, prep_res, exec_res):
+        shared["retrieved_context"] = exec_res
+
+class AnswerNode(Node):
+    def prep(self, shared):
+        return shared["user_query"], shared["retrieved_context"]
+
+    def exec(self, inputs):
+        query, context = inputs
+        return f"{query}: {len(context)} chunks"
+
+    def post(self, shared, prep_res, exec_res):
+        shared["answer"] = exec_res
+
+def traced_flow_class(config):
+    tracer = LangfuseTracer(config, client=FakeCollector())
+
+    @trace_flow(tracer=tracer, flow_name="RetrievalFlow")
+    class RetrievalFlow(Flow):
+        pass
+
+    return RetrievalFlow, tracer
+
+def build(flow_class):
+    search, answer = SearchNode(), AnswerNode()
+    search >> answer
+    return flow_class(start=search)
+
+def per_request(flow_class, n):
+    for i in range(n):
+        build(flow_class).run({"user_query": f"q{i}"})
+
+def reused(flow_class, n):
+    flow = build(flow_class)
+    for i in range(n):
+        flow.run({"user_query": f"q{i}"})
+
+def reused_concurrent(flow_class, n, workers=8):
+    flow = build(flow_class)
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(lambda i: flow.run({"user_query": f"q{i}"}) or i, range(n)))
+    assert len(results) == n
+
+def bench(label, fn, flow_class, n, tracer=None):
+    start = time.perf_counter()
+    fn(flow_class, n)
+    elapsed = time.perf_counter() - start
+    if tracer:
+        tracer.flush()
+    print(f"{label:<40} {elapsed / n * 1e6:8.1f} us/request")
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    bench("untraced, built per request", per_request, Flow, n)
+    bench("untraced, reused", reused, Flow, n)
+
+    for label, config in (
+        ("sampled", TracingConfig()),
+        ("unsampled", TracingConfig(sample_rate=0.0, metrics_enabled=False)),
+    ):
+        flow_class, tracer = traced_flow_class(config)
+        bench(f"traced {label}, built per request", per_request, flow_class, n, tracer)
+        bench(f"traced {label}, reused", reused, flow_class, n, tracer)
+        bench(f"traced {label}, reused, 8 threads", reused_concurrent, flow_class, n, tracer)
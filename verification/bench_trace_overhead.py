@@ -0,0 +1,128 @@
+"""
+Measures tracing overhead on a simulated 1k-document ingestion run.
+
+Run from the repo root:
+    python -m verification.bench_trace_overhead [n_docs]
+
+Compares an untraced flow, tracing with the old pass-through serializer and
+tracing with the size-capped TraceSerializer. The fake collector JSON-encodes
+every call, as the Langfuse SDK does before shipping, and counts the bytes.
+"""
+import sys
+import json
+import time
+
+from pocketflow import Node, Flow
+from tracing import LangfuseTracer, TracingConfig, trace_flow
+
+class FakeObservation:
+    def __init__(self, collector):
+        self.collector = collector
+
+    def span(self, **kwargs):
+        self.collector.ship(kwargs)
+        return FakeObservation(self.collector)
+
+    def update(self, **kwargs):
+        self.collector.ship(kwargs)
+
+    def end(self, **kwargs):
+        self.collector.ship(kwargs)
+
+class FakeCollector:
+    """Local stand-in for the Langfuse client."""
+    def __init__(self):
+        self.bytes = 0
+        self.calls = 0
+
+    def ship(self, payload):
+        self.calls += 1
+        self.bytes += len(json.dumps(payload, default=str))
+
+    def trace(self, **kwargs):
+        self.ship(kwargs)
+        return FakeObservation(self)
+
+    def flush(self):
+        pass
+
+class LegacySerializer:
+    """The serializer tracing used before: dicts and lists passed through whole."""
+    def serialize(self, data):
+        if isinstance(data, (dict, list, str, int, float, bool, type(None))):
+            return data
+        return {"_type": type(data).__name__, "_data": str(data)}
+
+class LoadNode(Node):
+    def prep(self, shared):
+        return shared["n_docs"]
+
+    def exec(self, n_docs):
+        paragraph = "Báo cáo doanh thu quý ba tăng trưởng so với cùng kỳ năm trước. " * 30
+        return [{"name": f"doc_{i}.txt", "id": f"id_{i}", "content": paragraph * 10} for i in range(n_docs)]
+
+    def post(self, shared, prep_res, exec_res):
+        shared["documents"] = exec_res
+
+class ChunkNode(Node):
+    def prep(self, shared):
+        return shared["documents"]
+
+    def exec(self, documents):
+        return [
+            {"text": doc["content"][i:i + 500], "metadata": {"source": doc["name"], "file_id": doc["id"], "chunk_index": i // 500}}
+            for doc in documents
+            for i in range(0, len(doc["content"]), 500)
+        ]
+
+    def post(self, shared, prep_res, exec_res):
+        shared["chunks"] = exec_res
+
+class IndexNode(Node):
+    def prep(self, shared):
+        return shared["chunks"]
+
+    def exec(self, chunks):
+        return f"Indexed {len(chunks)} chunks."
+
+    def post(self, shared, prep_res, exec_res):
+        shared["index_status"] = exec_res
+
+def build(flow_class):
+    load, chunk, index = LoadNode(), ChunkNode(), IndexNode()
+    load >> chunk >> index
+    return flow_class(start=load)
+
+def run(label, flow_class, n_docs, tracer=None, collector=None):
+    flow = build(flow_class)
+    start = time.perf_counter()
+    flow.run({"n_docs": n_docs})
+    run_time = time.perf_counter() - start
+    if tracer:
+        tracer.flush()
+    total = time.perf_counter() - start
+    shipped = f"{collector.bytes / 1e6:9.2f} MB in {collector.calls} calls" if collector else ""
+    print(f"{label:<22} run {run_time * 1000:8.1f} ms   run+export {total * 1000:8.1f} ms   {shipped}")
+
+def traced_flow_class(serializer=None):
+    collector = FakeCollector()
+    tracer = LangfuseTracer(TracingConfig(), client=collector)
+    if serializer:
+        tracer.serializer = serializer
+
+    @trace_flow(tracer=tracer, flow_name="Ingestion")
+    class TracedFlow(Flow):
+        pass
+
+    return TracedFlow, tracer, collector
+
+if __name__ == "__main__":
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    run("untraced", Flow, n_docs)
+
+    flow_class, tracer, collector = traced_flow_class(LegacySerializer())
+    run("traced (pass-through)", flow_class, n_docs, tracer, collector)
+
+    flow_class, tracer, collector = traced_flow_class()
+    run("traced (size-capped)", flow_class, n_docs, tracer, collector)
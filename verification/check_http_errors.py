@@ -0,0 +1,77 @@
+"""
+Error responses of the HTTP query service (server.py) against failing fake backends.
+
+Run from the repo root:
+    python -m verification.check_http_errors
+
+Uses the fakes of verification.load_test_http, then makes one backend fail
+at a time and checks what a client sees:
+  - search backend down: /search and /answer answer 500, not empty results
+  - Gemini failing mid-answer: the /answer stream ends with an "error" line, not "done"
+  - no matches: /search answers 200 with no results
+Exits non-zero if any check fails.
+"""
+import sys
+import json
+import http.client
+
+import nodes
+import server
+from verification.load_test_http import install_fakes, free_port, start_server, fake_hybrid_search, fake_stream_llm
+
+def search_down(query, limit=5, query_vectors=None, folder_ids=None):
+    raise ConnectionError("Qdrant unreachable")
+
+def no_matches(query, limit=5, query_vectors=None, folder_ids=None):
+    return []
+
+def failing_stream_llm(prompt):
+    yield "Phần đầu của câu trả lời. "
+    raise RuntimeError("Error calling Gemini: 503 overloaded")
+
+def post(port, path, query):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("POST", path, body=json.dumps({"query": query}), headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    body = response.read().decode("utf-8")
+    conn.close()
+    return response.status, body
+
+def last_line(body):
+    return json.loads(body.strip().splitlines()[-1])
+
+def main():
+    install_fakes()
+    port = free_port()
+    instance = start_server(port)
+    results = []
+
+    def check(label, ok, detail):
+        results.append(ok)
+        print(f"{'ok  ' if ok else 'FAIL'} {label}: {detail}")
+
+    # Distinct queries, so the search cache never answers
+    nodes.hybrid_search = search_down
+    status, body = post(port, "/search", "search down 1")
+    check("/search with search down", status == 500, f"{status} {body[:80]}")
+    status, body = post(port, "/answer", "search down 2")
+    check("/answer with search down", status == 500, f"{status} {body[:80]}")
+
+    nodes.hybrid_search = no_matches
+    status, body = post(port, "/search", "no matches")
+    check("/search with no matches", status == 200 and json.loads(body)["results"] == [], f"{status} {body[:80]}")
+
+    nodes.hybrid_search = fake_hybrid_search
+    server.stream_llm = failing_stream_llm
+    status, body = post(port, "/answer", "gemini failing")
+    check("/answer with Gemini failing", status == 200 and "error" in last_line(body), f"last line {body.strip().splitlines()[-1][:80]}")
+
+    server.stream_llm = fake_stream_llm
+    status, body = post(port, "/answer", "all up")
+    check("/answer with every backend up", status == 200 and last_line(body).get("done") is True, f"last line {body.strip().splitlines()[-1][:80]}")
+
+    instance.should_exit = True
+    return 0 if all(results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
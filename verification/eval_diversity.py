@@ -0,0 +1,84 @@
+"""
+Answer-context coverage and latency of search diversification.
+
+Run from the repo root against an ingested index:
+    python -m verification.eval_diversity "query one" "query two" ...
+    python -m verification.eval_diversity --file queries.txt [--limit 5] [--repeat 5]
+
+Each query is embedded once, then searched with several (mmr_lambda,
+max_per_file) settings; the first is the plain ColBERT top-k. For each
+setting it reports how many distinct files and separate context segments
+the results cover, the context tokens build_context packs for AnswerNode,
+and search latency (query_points plus diversification).
+"""
+import sys
+import time
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.search import QUERY_MODELS, embed_query, hybrid_search
+from utils.vector_store import hydrate_chunk_text
+from utils.context_builder import build_context, context_token_budget, merge_adjacent_chunks
+
+SETTINGS = [
+    ("top-k (no diversification)", 1.0, 0),
+    ("per-file cap 2", 1.0, 2),
+    ("MMR 0.7", 0.7, 0),
+    ("MMR 0.7 + cap 2", 0.7, 2),
+    ("MMR 0.5 + cap 2", 0.5, 2),
+]
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def evaluate(queries, limit, repeat):
+    vectors = {q: {kind: embed_query(kind, q) for kind in QUERY_MODELS} for q in queries}
+    budget = context_token_budget()
+
+    print(f"{len(queries)} queries, top {limit}, {repeat} timed runs each\n")
+    print(f"{'setting':<28} {'files':>6} {'segments':>9} {'ctx tokens':>11} {'p50 ms':>7} {'p95 ms':>7}")
+    for label, mmr_lambda, max_per_file in SETTINGS:
+        files, segments, tokens, latencies = [], [], [], []
+        for q in queries:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                points = hybrid_search(q, limit=limit, query_vectors=vectors[q],
+                                       mmr_lambda=mmr_lambda, max_per_file=max_per_file)
+                latencies.append(time.perf_counter() - start)
+
+            hydrate_chunk_text(points)
+            files.append(len({(p.payload or {}).get("file_id") for p in points}))
+            segments.append(len(merge_adjacent_chunks(points)))
+            tokens.append(build_context(points, budget)[1]["context_tokens"])
+
+        print(
+            f"{label:<28} {statistics.mean(files):>6.2f} {statistics.mean(segments):>9.2f} "
+            f"{statistics.mean(tokens):>11.0f} {statistics.median(latencies) * 1000:>7.1f} "
+            f"{percentile(latencies, 0.95) * 1000:>7.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("queries", nargs="*", help="queries to evaluate")
+    parser.add_argument("--file", help="file with one query per line")
+    parser.add_argument("--limit", type=int, default=5, help="results per query (AnswerNode uses 5)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed searches per query and setting")
+    args = parser.parse_args()
+
+    queries = list(args.queries)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            queries += [line.strip() for line in f if line.strip()]
+    if not queries:
+        parser.error("give queries or --file")
+
+    evaluate(queries, args.limit, args.repeat)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
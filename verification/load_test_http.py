@@ -0,0 +1,174 @@
+"""
+Load test for the HTTP query service (server.py) against fake backends.
+
+Run from the repo root:
+    python -m verification.load_test_http [n_requests] [concurrency]
+
+Embedding, Qdrant and Gemini are replaced by fakes that sleep like the real
+calls would (query embedding 5 ms per model, search 30 ms, an answer streamed
+in 10 pieces 20 ms apart). The server runs in-process under uvicorn on a free
+local port, and a mix of /search and /answer requests is sent once over
+kept-alive connections and once with a new connection per request, from
+one client thread per concurrent request.
+Throughput and latency percentiles are reported; for /answer the time to
+the first answer piece as well.
+"""
+import sys
+import json
+import time
+import queue
+import random
+import socket
+import threading
+import statistics
+import http.client
+
+import uvicorn
+
+import nodes
+import server
+
+EMBED_SECONDS = 0.005
+SEARCH_SECONDS = 0.03
+LLM_PIECES = 10
+LLM_PIECE_SECONDS = 0.02
+
+class FakePoint:
+    def __init__(self, rank):
+        self.id = rank
+        self.score = 1.0 - rank / 10
+        self.payload = {"source": f"doc_{rank}.pdf", "file_id": f"id_{rank}", "chunk_index": rank, "text": "Doanh thu quý ba tăng mạnh so với cùng kỳ. " * 20}
+
+class FakeRegistry:
+    def warm_up(self, *args, **kwargs):
+        return None
+
+def fake_embed_query(kind, query):
+    time.sleep(EMBED_SECONDS)
+    return [0.0] * 8
+
+def fake_hybrid_search(query, limit=5, query_vectors=None, folder_ids=None):
+    time.sleep(SEARCH_SECONDS)
+    return [FakePoint(rank) for rank in range(limit)]
+
+def fake_stream_llm(prompt):
+    for i in range(LLM_PIECES):
+        time.sleep(LLM_PIECE_SECONDS)
+        yield f"Phần {i} của câu trả lời. "
+
+def install_fakes():
+    nodes.embed_query = fake_embed_query
+    nodes.hybrid_search = fake_hybrid_search
+    nodes.hydrate_chunk_text = lambda points: None
+    server.hydrate_chunk_text = lambda points: None
+    server.stream_llm = fake_stream_llm
+    server.get_registry = lambda: FakeRegistry()
+    server.get_qdrant_client = lambda: None
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port):
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning",
+                            timeout_keep_alive=server.SERVER_KEEP_ALIVE)
+    instance = uvicorn.Server(config)
+    threading.Thread(target=instance.run, daemon=True).start()
+    while not instance.started:
+        time.sleep(0.05)
+    return instance
+
+def make_requests(n_requests, seed=7):
+    rng = random.Random(seed)
+    # Distinct queries, so the search cache never answers
+    return [("/answer" if rng.random() < 0.3 else "/search", f"doanh thu quý {i}") for i in range(n_requests)]
+
+def send(conn, path, query):
+    """One request; returns (ok, seconds to the first answer piece or None)."""
+    start = time.perf_counter()
+    body = {"query": query, "limit": 5} if path == "/search" else {"query": query}
+    conn.request("POST", path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    first_piece = None
+    if path == "/answer":
+        for line in iter(response.readline, b""):
+            if first_piece is None and "delta" in json.loads(line):
+                first_piece = time.perf_counter() - start
+    else:
+        response.read()
+    if response.getheader("Connection", "").lower() == "close":
+        conn.close()
+    return response.status == 200, first_piece
+
+def run_load(port, requests, concurrency, keep_alive):
+    latencies, first_pieces, errors = {}, [], []
+    work = queue.Queue()
+    for request in requests:
+        work.put(request)
+    lock = threading.Lock()
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while True:
+            try:
+                path, query = work.get_nowait()
+            except queue.Empty:
+                break
+            if not keep_alive:
+                conn.close()
+            start = time.perf_counter()
+            try:
+                ok, first_piece = send(conn, path, query)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                ok, first_piece = False, None
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.setdefault(path, []).append(elapsed)
+                if first_piece is not None:
+                    first_pieces.append(first_piece)
+                if not ok:
+                    errors.append(path)
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, first_pieces, len(errors)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def report(label, elapsed, latencies, first_piece, errors, n_requests):
+    print(f"\n{label}: {n_requests} requests in {elapsed:.2f}s -> {n_requests / elapsed:.1f} QPS, {errors} errors")
+    print(f"  {'endpoint':<20} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = sorted(latencies.items())
+    if first_piece:
+        rows.append(("/answer first piece", first_piece))
+    for name, values in rows:
+        print(
+            f"  {name:<20} {len(values):>8} {statistics.median(values) * 1000:>8.0f} "
+            f"{percentile(values, 0.95) * 1000:>8.0f} {percentile(values, 0.99) * 1000:>8.0f}"
+        )
+
+def main(n_requests, concurrency):
+    install_fakes()
+    port = free_port()
+    instance = start_server(port)
+    requests = make_requests(n_requests)
+
+    for label, keep_alive in (("keep-alive", True), ("new connection per request", False)):
+        elapsed, latencies, first_piece, errors = run_load(port, requests, concurrency, keep_alive)
+        report(label, elapsed, latencies, first_piece, errors, n_requests)
+
+    instance.should_exit = True
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    main(n_requests, concurrency)
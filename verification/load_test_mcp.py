@@ -0,0 +1,133 @@
+"""
+Load test for the MCP server tools against a fake Drive backend.
+
+Run from the repo root:
+    python -m verification.load_test_mcp [n_calls] [concurrency]
+
+Drive, the ingest journal and the search index are replaced by fakes that
+sleep like the real calls would (downloads 300 ms, listings 80 ms, searches
+30 ms). The same mix of calls is sent through an in-memory fastmcp Client to
+the async server in drive_mcp.py and to a copy whose tools block the event
+loop, and throughput and latency percentiles are reported.
+"""
+import sys
+import time
+import random
+import asyncio
+import statistics
+
+from fastmcp import FastMCP, Client
+
+import drive_mcp
+
+DOWNLOAD_SECONDS = 0.3
+LIST_SECONDS = 0.08
+SEARCH_SECONDS = 0.03
+
+class FakePoint:
+    def __init__(self, rank):
+        self.id = rank
+        self.score = 1.0 - rank / 10
+        self.payload = {"source": f"doc_{rank}.pdf", "file_id": f"id_{rank}", "chunk_index": rank, "text": "Doanh thu quý ba tăng."}
+
+class FakeJournal:
+    def get_content(self, file_id):
+        # Half the files were ingested and are served locally
+        return f"Cached text of {file_id}" if int(file_id.split("_")[1]) % 2 == 0 else None
+
+def fake_read_file(file_id, mime_type):
+    time.sleep(DOWNLOAD_SECONDS)
+    return f"Downloaded text of {file_id}"
+
+def fake_search_files(query):
+    time.sleep(LIST_SECONDS)
+    return [{"id": f"id_{i}", "name": f"{query}_{i}.pdf", "mimeType": "application/pdf"} for i in range(10)]
+
+def fake_hybrid_search(query, limit=5, query_vectors=None, folder_ids=None):
+    time.sleep(SEARCH_SECONDS)
+    return [FakePoint(rank) for rank in range(limit)]
+
+def install_fakes():
+    drive_mcp.read_file = fake_read_file
+    drive_mcp.search_files = fake_search_files
+    drive_mcp.hybrid_search = fake_hybrid_search
+    drive_mcp.hydrate_chunk_text = lambda points: None
+    drive_mcp.get_ingest_journal = lambda: FakeJournal()
+
+def build_blocking_server():
+    """
+    The tools as plain blocking calls on the event loop, as sync tools ran
+    under fastmcp 2.x: one slow download holds up every other call.
+    """
+    server = FastMCP("Blocking Drive MCP")
+
+    @server.tool(name="list_files")
+    async def list_files(query: str) -> str:
+        return drive_mcp._list_files(query)
+
+    @server.tool(name="search_documents")
+    async def search_documents(query: str, limit: int = 5) -> str:
+        return drive_mcp._search_documents(query, limit)
+
+    @server.tool(name="get_file_content")
+    async def get_file_content(file_id: str, mime_type: str = None) -> str:
+        return drive_mcp._get_file_content(file_id, mime_type)
+
+    return server
+
+def make_calls(n_calls, seed=7):
+    rng = random.Random(seed)
+    calls = []
+    for i in range(n_calls):
+        roll = rng.random()
+        if roll < 0.6:
+            calls.append(("search_documents", {"query": f"doanh thu {i}", "limit": 5}))
+        elif roll < 0.8:
+            calls.append(("list_files", {"query": f"report {i}"}))
+        else:
+            calls.append(("get_file_content", {"file_id": f"id_{i}", "mime_type": "application/pdf"}))
+    return calls
+
+async def run_load(server, calls, concurrency):
+    latencies = {}
+    gate = asyncio.Semaphore(concurrency)
+
+    async with Client(server) as client:
+        async def one(tool, args):
+            async with gate:
+                start = time.perf_counter()
+                await client.call_tool(tool, args)
+                latencies.setdefault(tool, []).append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(tool, args) for tool, args in calls))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def report(label, elapsed, latencies, n_calls):
+    print(f"\n{label}: {n_calls} calls in {elapsed:.2f}s -> {n_calls / elapsed:.1f} calls/s")
+    print(f"  {'tool':<18} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for tool, values in sorted(latencies.items()):
+        print(
+            f"  {tool:<18} {len(values):>6} {statistics.median(values) * 1000:>8.0f} "
+            f"{percentile(values, 0.95) * 1000:>8.0f} {percentile(values, 0.99) * 1000:>8.0f}"
+        )
+
+async def main(n_calls, concurrency):
+    install_fakes()
+    calls = make_calls(n_calls)
+
+    elapsed, latencies = await run_load(build_blocking_server(), calls, concurrency)
+    report("blocking tools", elapsed, latencies, n_calls)
+
+    elapsed, latencies = await run_load(drive_mcp.mcp, calls, concurrency)
+    report("async tools", elapsed, latencies, n_calls)
+
+if __name__ == "__main__":
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    asyncio.run(main(n_calls, concurrency))